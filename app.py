@@ -1,116 +1,43 @@
-from flask import Flask, request, jsonify, send_from_directory, Response, stream_with_context, send_file
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-import base64, os, time, queue, shutil
-from threading import Event
-from selenium.webdriver.chrome.service import Service
-from webdriver_manager.chrome import ChromeDriverManager
-from selenium.common.exceptions import TimeoutException
-import pytz
-from datetime import datetime, timedelta
+from flask import Flask, request, jsonify, send_from_directory, Response, stream_with_context, send_file, url_for
+import os, time, atexit
+from jobs import JobSupervisor
+from job_store import JobStore, JobBoard
+from maintenance import maintenance_calendar
+import scrape_config
+from zip_stream import stream_zip
+from archive import archive_path, archive_is_current
+from job_trace import JobTrace
 
-scraping_event = Event()
-log_queue = queue.Queue()
-driver = None
 app = Flask(__name__)
 SAVE_DIR = os.path.abspath("pdf_output")  # Default directory
 os.makedirs(SAVE_DIR, exist_ok=True)
+APPEND_ARCHIVE = os.environ.get("APPEND_ARCHIVE", "0") == "1"  # default for the archive option of /scrape
+TRACE_JOBS = os.environ.get("TRACE_JOBS", "0") == "1"  # default for the trace option of /scrape
+ADAPTIVE_JOBS = os.environ.get("ADAPTIVE_CONCURRENCY", "1") == "1"  # default for the adaptive option of /scrape
 
 @app.route('/')
 def index():
     return send_from_directory('.', 'index.html')
 
-def get_chrome_options(save_location):
-    options = Options()
-    options.add_argument("--disable-gpu")
-    options.add_argument("--no-sandbox")
-    options.add_argument("--disable-dev-shm-usage")
-    options.add_argument("--window-size=1920,1080")
-    
-    # Set download preferences
-    prefs = {
-        "download.default_directory": save_location,
-        "download.prompt_for_download": False,
-        "download.directory_upgrade": True,
-        "safebrowsing.enabled": True
-    }
-    options.add_experimental_option("prefs", prefs)
-    return options
-
-def initialize_driver(save_dir):
-    try:
-        # Get ChromeDriver path using the default installation
-        driver_path = ChromeDriverManager().install()
-        
-        # Ensure we're using the correct chromedriver.exe file
-        driver_dir = os.path.dirname(driver_path)
-        if not driver_path.endswith('chromedriver.exe'):
-            # Look for chromedriver.exe in the directory
-            possible_paths = [
-                os.path.join(driver_dir, 'chromedriver.exe'),
-                os.path.join(driver_dir, 'chromedriver-win32', 'chromedriver.exe'),
-                os.path.join(driver_dir, 'chromedriver-win64', 'chromedriver.exe')
-            ]
-            
-            for path in possible_paths:
-                if os.path.exists(path):
-                    driver_path = path
-                    break
-            else:
-                raise Exception(f"Could not find chromedriver.exe in {driver_dir}")
-        
-        log_message(f"Using ChromeDriver at: {driver_path}", level='INFO')
-        
-        # Create service with explicit path
-        service = Service(executable_path=driver_path)
-        
-        # Initialize Chrome with options
-        options = get_chrome_options(save_dir)
-        driver = webdriver.Chrome(service=service, options=options)
-        return driver
-    except Exception as e:
-        log_message(f"Error initializing ChromeDriver: {str(e)}", level='ERROR')
-        if "not a valid Win32 application" in str(e):
-            log_message("This error typically occurs when ChromeDriver is not compatible with your system.", level='WARNING')
-            log_message("Please ensure you have the latest version of Chrome browser installed.", level='WARNING')
-            log_message("You may need to manually download ChromeDriver from: https://chromedriver.chromium.org/downloads", level='WARNING')
-            log_message("After downloading, extract chromedriver.exe and place it in: " + driver_dir, level='WARNING')
-        raise
+# Scrape jobs run in background worker processes, each with its own warm browser pool;
+# jobs that arrive during a maintenance window wait in the supervisor until it ends.
+# Under serve.py the supervisor runs in the parent process and this process only
+# sees the jobs through the shared store.
+if os.environ.get("JOB_STORE_SHARED") == "1":
+    supervisor = JobBoard(JobStore(), calendar=maintenance_calendar)
+else:
+    supervisor = JobSupervisor(
+        processes=int(os.environ.get("JOB_WORKERS", 2)),
+        log_capacity=int(os.environ.get("LOG_BUFFER_LINES", 2000)),
+        calendar=maintenance_calendar,
+    )
+SSE_KEEPALIVE = 15          # seconds between keepalive comments on a quiet stream
+SSE_BATCH_WINDOW = 0.05     # seconds to let a burst of log lines coalesce into one event
+SSE_BATCH_LIMIT = 200       # max log lines per event
+atexit.register(supervisor.shutdown)
 
 @app.route('/scrape', methods=['POST'])
 def scrape():
-    # Maintenance window: 10:58pm to 12:31am IST
-    ist = pytz.timezone('Asia/Kolkata')
-    now_ist = datetime.now(ist)
-    
-    # Set maintenance start time (10:58 PM)
-    start_maint = now_ist.replace(hour=22, minute=58, second=0, microsecond=0)
-    
-    # Set maintenance end time (12:31 AM next day)
-    end_maint = now_ist.replace(hour=0, minute=31, second=0, microsecond=0)
-    if now_ist.hour >= 22:  # If current time is after 10 PM
-        end_maint = end_maint + timedelta(days=1)
-    
-    # Check if current time is within maintenance window
-    in_maintenance = False
-    if now_ist.hour >= 22:  # After 10 PM
-        in_maintenance = now_ist >= start_maint
-    elif now_ist.hour < 1:  # Before 1 AM
-        in_maintenance = now_ist < end_maint
-    
-    if in_maintenance:
-        return jsonify({"message": "Website under maintenance. Please try again after 12:31 AM IST."}), 503
-
-    global SAVE_DIR, driver
-    scraping_event.clear()
-    scraping_event.set()
-    
-    while not log_queue.empty():
-        log_queue.get()
-
     data = request.get_json()
     login_url = data.get("loginUrl")
     table_urls = data.get("urls", [])
@@ -140,204 +67,240 @@ def scrape():
         return jsonify({"message": "Login URL, table URLs, and folder name are required."}), 400
 
     # Create the user-specified folder inside pdf_output
-    base_dir = os.path.abspath("pdf_output")
-    save_dir = os.path.join(base_dir, folder_name)
+    save_dir = resolve_folder(folder_name)
+    if save_dir is None:
+        return jsonify({"message": "Invalid folder name."}), 400
     try:
         os.makedirs(save_dir, exist_ok=True)
-        log_message(f"PDFs will be saved to: {save_dir}", level='INFO')
     except Exception as e:
         return jsonify({"message": f"Error creating save directory: {str(e)}"}), 400
 
-    driver = None
+    workers = data.get("workers", 1)
     try:
-        driver = initialize_driver(save_dir)
-        wait = WebDriverWait(driver, 10)
-
-        driver.get(login_url)
-        log_message("Opened login page", level='INFO')
-        time.sleep(2)
-
-        for table_idx, table_url in enumerate(table_urls):
-            log_message(f"Opening table URL {table_idx + 1}", level='INFO')
-            driver.execute_script(f"window.open('{table_url}', '_blank');")
-            driver.switch_to.window(driver.window_handles[-1])
-            time.sleep(3)
-
-            try:
-                rows = wait.until(EC.presence_of_all_elements_located((By.XPATH, '//tr[starts-with(@id, "R")]')))
-                log_message(f"Found {len(rows)} rows in table {table_idx + 1}", level='INFO')
-            except TimeoutException:
-                log_message(f"Table {table_idx + 1} took too long to load or has too much data. Skipping this table.", level='WARNING')
-                driver.close()
-                driver.switch_to.window(driver.window_handles[0])
-                continue
-
-            # Calculate the end index for the loop
-            end_index = len(rows)
-            if last_index is not None:
-                end_index = min(last_index, len(rows))
-
-            for index in range(start_index, end_index):
-                log_message(f"Processing row {index + 1}", level='INFO')
-                rows = driver.find_elements(By.XPATH, '//tr[starts-with(@id, "R")]')
-                driver.execute_script("arguments[0].click();", rows[index])
-                time.sleep(3)
-
-                # Check for error/placeholder content in the page
-                page_source = driver.page_source.lower()
-                error_keywords = [
-                    'no data', 'session expired', 'error', 'maintenance', 'not available', 'temporarily unavailable', 'try again later', 'invalid', 'unauthorized', 'forbidden',
-                    'user validation required to continue'
-                ]
-                if any(keyword in page_source for keyword in error_keywords):
-                    log_message(f"Error: Unexpected content detected on row {index + 1}. Stopping automation.", level='ERROR')
-                    return jsonify({"message": "Error: Unexpected content detected (e.g., session expired, no data, or maintenance page). Automation stopped."}), 500
-
-                # Extract data from the table row
-                try:
-                    # Assuming the data is in specific columns, adjust the indices as needed
-                    row_data = rows[index].find_elements(By.TAG_NAME, "td")
-                    waqf_id = row_data[0].text.strip() if len(row_data) > 0 else "unknown"
-                    property_id = row_data[1].text.strip() if len(row_data) > 1 else "unknown"
-                    district = row_data[2].text.strip() if len(row_data) > 2 else "unknown"
-                    # state = row_data[3].text.strip() if len(row_data) > 3 else "unknown"
-                    
-                    # Create filename with extracted data
-                    filename = f"{waqf_id}_{property_id}_{district}.pdf"
-                    # Clean filename to remove any invalid characters
-                    filename = "".join(c for c in filename if c.isalnum() or c in ('_', '-', '.'))
-                except Exception as e:
-                    log_message(f"Error extracting row data: {str(e)}", level='ERROR')
-                    filename = f"table{table_idx+1}_row{index+1}.pdf"  # Fallback to original naming
-
-                driver.switch_to.window(driver.window_handles[-1])
-                time.sleep(2)
-
-                result = driver.execute_cdp_cmd("Page.printToPDF", {"printBackground": True})
-                pdf_data = base64.b64decode(result['data'])
-
-                with open(os.path.join(save_dir, filename), "wb") as f:
-                    f.write(pdf_data)
-                log_message(f" Saved: {filename}", level='SUCCESS')
-
-                driver.close()
-                driver.switch_to.window(driver.window_handles[-1])
-                time.sleep(1)
-
-            driver.close()
-            driver.switch_to.window(driver.window_handles[0])
-
-        return jsonify({"message": f" Scraping completed. PDFs saved in 'pdf_output/{folder_name}' folder."}, level='SUCCESS')
-
-    except Exception as e:
-        log_message("Error: " + str(e), level='ERROR')
-        return jsonify({"message": f" Error: {str(e)}"}), 500
+        workers = max(1, min(int(workers), scrape_config.MAX_WORKERS, scrape_config.BROWSER_POOL_SIZE))
+    except (TypeError, ValueError):
+        workers = 1
 
-    finally:
-        if driver is not None:
-            try:
-                driver.quit()
-                log_message("Browser closed", level='INFO')
-            except Exception as e:
-                log_message(f"Error closing browser: {str(e)}", level='ERROR')
+    # By default every table may be split across all workers; shards=1 turns that off
+    shards = data.get("shards", workers)
+    try:
+        shards = max(1, int(shards))
+    except (TypeError, ValueError):
+        shards = workers
+    if shards == 1:
+        workers = min(workers, len(table_urls))
+
+    # errorKeywords: a list of strings or one "|"-separated string; blanks are dropped
+    error_keywords = data.get("errorKeywords")
+    if error_keywords is None:
+        error_keywords = scrape_config.ERROR_KEYWORDS
+    else:
+        if isinstance(error_keywords, str):
+            error_keywords = error_keywords.split("|")
+        if not isinstance(error_keywords, list) or not all(isinstance(k, str) for k in error_keywords):
+            return jsonify({"message": "errorKeywords must be a list of strings."}), 400
+        error_keywords = [k.strip() for k in error_keywords if k.strip()]
+        if not error_keywords:
+            return jsonify({"message": "errorKeywords must contain at least one keyword."}), 400
+
+    fingerprint_columns = data.get("fingerprintColumns", scrape_config.FINGERPRINT_COLUMNS)
+    try:
+        fingerprint_columns = [int(c) for c in fingerprint_columns]
+    except (TypeError, ValueError):
+        return jsonify({"message": "fingerprintColumns must be a list of column numbers."}), 400
+
+    spec = {
+        "login_url": login_url,
+        "table_urls": table_urls,
+        "folder_name": folder_name,
+        "save_dir": save_dir,
+        "start_index": start_index,
+        "last_index": last_index,
+        "workers": workers,
+        "shards": shards,
+        "record_selector": data.get("recordSelector") or scrape_config.RECORD_READY_SELECTOR,
+        "error_keywords": error_keywords,
+        "error_container": data.get("errorContainer") or scrape_config.ERROR_CONTAINER_SELECTOR,
+        # Skip rows the checkpoint journal already records as saved (and verified on disk)
+        "resume": bool(data.get("resume")),
+        # Only print rows that are new or changed since the folder's last run
+        "incremental": bool(data.get("incremental")),
+        # Append each saved PDF to pdf_output/<folder>.zip as the job runs
+        "archive": bool(data.get("archive", APPEND_ARCHIVE)),
+        # Record timed spans for every row step, downloadable from /jobs/<id>/trace
+        "trace": bool(data.get("trace", TRACE_JOBS)),
+        # Let the job find how many browsers and rows per second the site tolerates, up to workers
+        "adaptive": bool(data.get("adaptive", ADAPTIVE_JOBS)),
+        "fingerprint_columns": fingerprint_columns,
+    }
+    job = supervisor.submit(spec)
+    if job is None:
+        return jsonify({"message": "Server is shutting down; try again shortly."}), 503
+    log_message(f"Queued job {job['id']} for '{folder_name}'", level='INFO')
+    return job_accepted(job)
+
+def job_accepted(job):
+    message = "Scraping job queued."
+    if job["status"] == "deferred":
+        message = f"Website under maintenance. Job will start after {maintenance_calendar.describe(job['startAt'])}."
+    return jsonify({
+        "message": message,
+        "jobId": job["id"],
+        "status": job["status"],
+        "statusUrl": f"/jobs/{job['id']}",
+        "streamUrl": f"/stream?job={job['id']}",
+    }), 202
+
+@app.route('/jobs')
+def list_jobs():
+    return jsonify({"jobs": supervisor.list()})
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    job = supervisor.get(job_id)
+    if job is None:
+        return jsonify({"message": "Job not found"}), 404
+    return jsonify(job)
+
+@app.route('/jobs/<job_id>/trace')
+def job_trace(job_id):
+    job = supervisor.get(job_id)
+    if job is None:
+        return jsonify({"message": "Job not found"}), 404
+    path = JobTrace.for_job(job_id).path
+    if not job.get("trace") or not os.path.exists(path):
+        return jsonify({"message": "No trace recorded for this job"}), 404
+    # Chrome trace-event JSON; open in chrome://tracing or ui.perfetto.dev
+    return send_file(path, mimetype='application/json', as_attachment=True, download_name=f"trace-{job_id}.json", max_age=0)
+
+@app.route('/jobs/<job_id>/resume', methods=['POST'])
+def resume_job(job_id):
+    job = supervisor.get(job_id)
+    if job is None:
+        return jsonify({"message": "Job not found"}), 404
+    if job["status"] in ("queued", "running"):
+        return jsonify({"message": "Job is still active"}), 409
+    job = supervisor.resubmit(job_id, resume=True)
+    if job is None:
+        return jsonify({"message": "Server is shutting down; try again shortly."}), 503
+    log_message(f"Queued job {job['id']} resuming {job_id}", level='INFO')
+    return job_accepted(job)
 
 def log_message(message, level='INFO'):
-    # Remove the level prefix for most messages to match the desired format
-    if level in ['INFO', 'SUCCESS']:
-        log_queue.put(message)
-        print(message)
-    else:
-        # Keep the prefix only for errors and warnings
-        prefix = {
-            'ERROR': '[ERROR] ',
-            'WARNING': '[WARNING] '
-        }.get(level, '')
-        log_queue.put(prefix + message)
-        print(prefix + message)
+    # Web-process messages only; job logs come from the workers through the supervisor
+    prefix = {
+        'ERROR': '[ERROR] ',
+        'WARNING': '[WARNING] '
+    }.get(level, '')
+    print(prefix + message)
+
+def sse_event(entries):
+    # Coalesce a burst of log lines into one event; the browser joins data lines with "\n"
+    lines = []
+    for _, message in entries:
+        lines.extend(f"data: {line}" for line in str(message).split("\n"))
+    return f"id: {entries[-1][0]}\n" + "\n".join(lines) + "\n\n"
 
 @app.route('/stream')
 def stream():
+    job_id = request.args.get('job') or supervisor.latest()
+    channel = supervisor.log_channel(job_id) if job_id else None
+    if channel is None:
+        return jsonify({"message": "Job not found"}), 404
+    try:
+        # EventSource sends Last-Event-ID itself when it reconnects
+        last_id = int(request.headers.get('Last-Event-ID') or request.args.get('lastEventId') or 0)
+    except ValueError:
+        last_id = 0
+
     def generate():
+        nonlocal last_id
         while True:
-            try:
-                message = log_queue.get(timeout=1)
-                yield f"data: {message}\n\n"
-            except queue.Empty:
-                if not scraping_event.is_set():
-                    break
-    return Response(stream_with_context(generate()), mimetype='text/event-stream')
+            entries, dropped, closed = channel.read(last_id, timeout=SSE_KEEPALIVE, limit=SSE_BATCH_LIMIT)
+            if dropped:
+                yield f"data: [WARNING] {dropped} earlier log lines are no longer available\n\n"
+            if entries:
+                last_id = entries[-1][0]
+                yield sse_event(entries)
+                if not closed and len(entries) < SSE_BATCH_LIMIT:
+                    # Let a burst accumulate instead of sending one event per line
+                    time.sleep(SSE_BATCH_WINDOW)
+            elif not closed:
+                yield ": keepalive\n\n"
+            if closed:
+                job = supervisor.get(job_id)
+                yield f"event: end\ndata: {job['status'] if job else 'unknown'}\n\n"
+                break
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/metrics')
+def metrics():
+    # Prometheus text format; row pipeline numbers arrive from the worker processes every few seconds
+    return Response(supervisor.metrics_text(), mimetype='text/plain; version=0.0.4')
 
 @app.route('/abort', methods=['POST'])
 def abort_scraping():
-    global driver
-    scraping_event.clear()
-    if driver:
-        try:
-            driver.quit()
-            driver = None
-            log_message("Browser closed due to abort request", level='INFO')
-        except Exception as e:
-            log_message(f"Error closing browser: {str(e)}", level='ERROR')
-    return jsonify({"message": "Operation aborted"}), 200
+    data = request.get_json(silent=True) or {}
+    job_id = data.get("jobId") or supervisor.latest()
+    if not job_id or not supervisor.abort(job_id):
+        return jsonify({"message": "Job not found"}), 404
+    return jsonify({"message": "Operation aborted", "jobId": job_id}), 200
+
+def resolve_folder(folder_name):
+    # Only direct children of SAVE_DIR, and no hidden ones
+    if not isinstance(folder_name, str) or not folder_name or os.path.basename(folder_name) != folder_name \
+            or folder_name.startswith('.') or '\\' in folder_name:
+        return None
+    return os.path.join(SAVE_DIR, folder_name)
 
 @app.route('/create-zip', methods=['POST'])
 def create_zip():
-    try:
-        data = request.get_json()
-        folder_name = data.get('folderName')
-        if not folder_name:
-            log_message("No folder name provided", level='ERROR')
-            return jsonify({"message": "Folder name is required"}), 400
-
-        # Path to the folder we want to zip
-        folder_path = os.path.join(SAVE_DIR, folder_name)
-        log_message(f"Checking folder path: {folder_path}", level='INFO')
-        
-        if not os.path.exists(folder_path):
-            log_message(f"Folder not found: {folder_path}", level='ERROR')
-            return jsonify({"message": "Folder not found"}), 404
-
-        if not os.path.isdir(folder_path):
-            log_message(f"Path exists but is not a directory: {folder_path}", level='ERROR')
-            return jsonify({"message": "Invalid folder path"}), 400
-
-        # List contents of the folder
-        files = os.listdir(folder_path)
-        log_message(f"Found {len(files)} files in the folder", level='INFO')
-
-        # Create a zip file in the same directory
-        zip_path = os.path.join(SAVE_DIR, f"{folder_name}.zip")
-        log_message(f"Creating zip at: {zip_path}", level='INFO')
-        
-        # Remove existing zip file if it exists
-        if os.path.exists(zip_path):
-            try:
-                os.remove(zip_path)
-                log_message("Removed existing zip file", level='INFO')
-            except Exception as e:
-                log_message(f"Error removing existing zip: {str(e)}", level='ERROR')
-                return jsonify({"message": f"Error removing existing zip file: {str(e)}"}), 500
-            
-        # Create the zip file
-        try:
-            shutil.make_archive(os.path.join(SAVE_DIR, folder_name), 'zip', folder_path)
-            log_message("ZIP file created successfully", level='SUCCESS')
-        except Exception as e:
-            log_message(f"Error during zip creation: {str(e)}", level='ERROR')
-            return jsonify({"message": f"Error creating ZIP file: {str(e)}"}), 500
-        
-        # Verify the zip was created
-        if os.path.exists(zip_path):
-            return jsonify({
-                "message": f"ZIP file created successfully at pdf_output/{folder_name}.zip"
-            })
-        else:
-            log_message("ZIP file was not created", level='ERROR')
-            return jsonify({"message": "Failed to create ZIP file: File not found after creation"}), 500
-
-    except Exception as e:
-        log_message(f"Unexpected error creating ZIP file: {str(e)}", level='ERROR')
-        return jsonify({"message": f"Error creating ZIP file: {str(e)}"}), 500
+    # Nothing is built here any more; the archive is streamed by /download-zip
+    data = request.get_json() or {}
+    folder_name = data.get('folderName')
+    if not folder_name:
+        log_message("No folder name provided", level='ERROR')
+        return jsonify({"message": "Folder name is required"}), 400
+
+    folder_path = resolve_folder(folder_name)
+    if folder_path is None:
+        return jsonify({"message": "Invalid folder path"}), 400
+    if not os.path.isdir(folder_path):
+        log_message(f"Folder not found: {folder_path}", level='ERROR')
+        return jsonify({"message": "Folder not found"}), 404
+
+    return jsonify({
+        "message": f"ZIP download of pdf_output/{folder_name} started",
+        "downloadUrl": url_for('download_zip', folder_name=folder_name),
+    })
+
+@app.route('/download-zip/<folder_name>')
+def download_zip(folder_name):
+    folder_path = resolve_folder(folder_name)
+    if folder_path is None:
+        return jsonify({"message": "Invalid folder path"}), 400
+    if not os.path.isdir(folder_path):
+        return jsonify({"message": "Folder not found"}), 404
+
+    if archive_is_current(folder_path):
+        # Kept up to date by the job that filled the folder; nothing to build
+        return send_file(archive_path(folder_path), mimetype='application/zip', as_attachment=True, download_name=f"{folder_name}.zip")
+
+    log_message(f"Streaming ZIP of {folder_path}", level='INFO')
+    headers = {
+        'Content-Disposition': f'attachment; filename="{folder_name}.zip"',
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    }
+    # No Content-Length: the size is only known once the last entry is written
+    return Response(stream_with_context(stream_zip(folder_path)), mimetype='application/zip', headers=headers)
 
 if __name__ == '__main__':
+    # Development server; production runs through serve.py
+    # With the reloader on, only the serving child process should start the workers
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        supervisor.start()
     app.run(host='0.0.0.0', port=5000, debug=True)
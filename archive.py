@@ -0,0 +1,181 @@
+import os, queue, struct, threading, time, zipfile
+from zip_stream import archive_members
+
+ARCHIVE_CHECKPOINT_ROWS = int(os.environ.get("ARCHIVE_CHECKPOINT_ROWS", 50))
+ARCHIVE_CHECKPOINT_SECONDS = float(os.environ.get("ARCHIVE_CHECKPOINT_SECONDS", 30))
+
+
+def archive_path(folder_path):
+    # pdf_output/<folder>.zip, where /create-zip used to build it
+    return folder_path.rstrip(os.sep) + ".zip"
+
+
+def archive_is_current(folder_path):
+    # True when the prebuilt archive is closed and holds exactly the folder's files
+    path = archive_path(folder_path)
+    if os.path.exists(path + ".writing") or not zipfile.is_zipfile(path):
+        return False
+    try:
+        with zipfile.ZipFile(path) as archive:
+            entries = archive.NameToInfo
+            members = archive_members(folder_path)
+            if len(members) != len(entries):
+                return False
+            for member_path, arcname in members:
+                info = entries.get(arcname)
+                if info is None or info.file_size != os.path.getsize(member_path):
+                    return False
+    except (OSError, zipfile.BadZipFile):
+        return False
+    return True
+
+
+class ArchiveWriter:
+    # Keeps <folder>.zip up to date while a job runs. Saved PDFs are appended
+    # (STORED) by a background thread; the central directory is only written at
+    # checkpoints, by closing the archive and reopening it in append mode, which
+    # costs one directory record per entry rather than a copy of every file.
+    # A PDF printed again replaces its entry in the directory; the old bytes stay
+    # in the file as dead space. Appending writes over the previous directory,
+    # so a copy of it is kept in <folder>.zip.index at every checkpoint; after a
+    # crash (the .writing marker or the index is still there when the next run
+    # starts) the file is cut back to that checkpoint and the directory restored.
+    def __init__(self, folder_path, log, checkpoint_rows=None, checkpoint_seconds=None):
+        self.folder_path = folder_path
+        self.path = archive_path(folder_path)
+        self.index_path = self.path + ".index"
+        self.log = log
+        self.checkpoint_rows = checkpoint_rows or ARCHIVE_CHECKPOINT_ROWS
+        self.checkpoint_seconds = checkpoint_seconds or ARCHIVE_CHECKPOINT_SECONDS
+        self.entries = 0
+        self._queue = queue.Queue()
+        self._thread = None
+        self._torn = False
+
+    def start(self):
+        # Marks the archive as incomplete until close(); /download-zip streams instead meanwhile.
+        # Both are removed on a clean close, so finding either means the last run crashed.
+        self._torn = os.path.exists(self.path + ".writing") or os.path.exists(self.index_path)
+        open(self.path + ".writing", "w").close()
+        self._thread = threading.Thread(target=self._run, name="archive-writer", daemon=True)
+        self._thread.start()
+
+    def add(self, filename):
+        self._queue.put(filename)
+
+    def close(self):
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+
+    def _open(self):
+        # A torn append can still look like a valid zip (an old directory may follow it),
+        # so only a clean last close is trusted; the sync below adds back whatever the checkpoint lacks
+        torn, self._torn = self._torn, False
+        if os.path.exists(self.path) and (torn or not zipfile.is_zipfile(self.path)):
+            if self._restore_index():
+                self.log("Archive was not closed cleanly; restored it to its last checkpoint", level='WARNING')
+            else:
+                self.log("Archive was not closed cleanly; rebuilding it", level='WARNING')
+                os.remove(self.path)
+        archive = zipfile.ZipFile(self.path, "a", compression=zipfile.ZIP_STORED, allowZip64=True)
+        self._save_index(archive)
+        return archive
+
+    def _save_index(self, archive):
+        # The directory as it is on disk now, and where it starts (the next entry is written there)
+        with open(self.path, "rb") as f:
+            f.seek(archive.start_dir)
+            directory = f.read()
+        if not directory:
+            # A new, still empty archive has nothing to go back to
+            if os.path.exists(self.index_path):
+                os.remove(self.index_path)
+            return
+        with open(self.index_path + ".tmp", "wb") as f:
+            f.write(struct.pack(">Q", archive.start_dir))
+            f.write(directory)
+        os.replace(self.index_path + ".tmp", self.index_path)
+
+    def _restore_index(self):
+        try:
+            with open(self.index_path, "rb") as f:
+                offset, = struct.unpack(">Q", f.read(8))
+                directory = f.read()
+        except (OSError, struct.error):
+            return False
+        if not directory or os.path.getsize(self.path) < offset:
+            return False
+        with open(self.path, "r+b") as f:
+            f.truncate(offset)
+            f.seek(offset)
+            f.write(directory)
+        return zipfile.is_zipfile(self.path)
+
+    def _append(self, archive, path, arcname):
+        old = archive.NameToInfo.pop(arcname, None)
+        if old is not None:
+            archive.filelist.remove(old)
+        archive.write(path, arcname, compress_type=zipfile.ZIP_STORED)
+
+    def _sync(self, archive):
+        # Bring the archive in line with the folder: files saved by earlier runs
+        # or lost in a crash are added, deleted ones dropped from the directory
+        members = archive_members(self.folder_path)
+        names = set()
+        added = 0
+        for path, arcname in members:
+            names.add(arcname)
+            info = archive.NameToInfo.get(arcname)
+            if info is None or info.file_size != os.path.getsize(path):
+                self._append(archive, path, arcname)
+                added += 1
+        for info in [info for info in archive.filelist if info.filename not in names]:
+            archive.filelist.remove(info)
+            archive.NameToInfo.pop(info.filename, None)
+        if added:
+            self.log(f"Added {added} existing file(s) to {os.path.basename(self.path)}", level='INFO')
+        return added
+
+    def _run(self):
+        archive = None
+        try:
+            archive = self._open()
+            pending = self._sync(archive)
+            last_checkpoint = time.monotonic()
+            done = False
+            while not done:
+                try:
+                    filename = self._queue.get(timeout=self.checkpoint_seconds)
+                except queue.Empty:
+                    filename = ''
+                if filename is None:
+                    done = True
+                elif filename:
+                    try:
+                        self._append(archive, os.path.join(self.folder_path, filename), filename)
+                        pending += 1
+                    except OSError as e:
+                        self.log(f"Could not add {filename} to the archive: {str(e)}", level='WARNING')
+                if pending and not done and (pending >= self.checkpoint_rows or time.monotonic() - last_checkpoint >= self.checkpoint_seconds):
+                    # Write the central directory and keep a copy of it, so a crash loses at most the entries since here
+                    archive.close()
+                    archive = self._open()
+                    pending = 0
+                    last_checkpoint = time.monotonic()
+            self.entries = len(archive.filelist)
+            archive.close()
+            archive = None
+            if os.path.exists(self.index_path):
+                os.remove(self.index_path)
+            os.remove(self.path + ".writing")
+        except Exception as e:
+            self.log(f"Archive writer stopped: {str(e)}", level='ERROR')
+        finally:
+            if archive is not None:
+                try:
+                    archive.close()
+                except Exception:
+                    pass
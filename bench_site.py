@@ -0,0 +1,85 @@
+import os, secrets, threading, time
+from flask import Flask, request, make_response, abort
+from werkzeug.serving import make_server
+
+# Local stand-in for the records site, for benchmarks and load tests: a login
+# page that sets a session cookie, table pages of <tr id="R..."> rows, and
+# record pages that open in a new window when a row is clicked.
+
+PAGE = "<!DOCTYPE html><html><head><meta charset='utf-8'><title>{title}</title></head><body>{body}</body></html>"
+
+
+def create_site(rows=50, tables=1, latency_ms=0, payload_kb=20, error_rows=(), expire_after=0):
+    # error_rows: record numbers (1-based) that show a "no data" page instead
+    # expire_after: records a session may view before the site reports it expired (0 = never)
+    site = Flask(__name__)
+    sessions = {}
+    lock = threading.Lock()
+    filler = ("<p>" + "Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 16 + "</p>\n")
+    payload = filler * max(1, (payload_kb * 1024) // len(filler))
+
+    def delay():
+        if latency_ms:
+            time.sleep(latency_ms / 1000.0)
+
+    def page(title, body):
+        delay()
+        return PAGE.format(title=title, body=body)
+
+    @site.route('/login')
+    def login():
+        sid = secrets.token_hex(8)
+        with lock:
+            sessions[sid] = 0
+        response = make_response(page("Sign in", "<h1>Welcome</h1><p>Signed in.</p>"))
+        response.set_cookie("sid", sid, httponly=True)
+        return response
+
+    @site.route('/table/<int:table>')
+    def table(table):
+        if table < 1 or table > tables:
+            abort(404)
+        body = ["<table><tr><th>Waqf ID</th><th>Property ID</th><th>District</th></tr>"]
+        for i in range(1, rows + 1):
+            body.append(
+                f"<tr id=\"R{i}\" onclick=\"window.open('/record/{table}/{i}', '_blank')\">"
+                f"<td>W{table}-{i:05d}</td><td>P{i:05d}</td><td>Bench</td></tr>"
+            )
+        body.append("</table>")
+        return page(f"Table {table}", "\n".join(body))
+
+    @site.route('/record/<int:table>/<int:row>')
+    def record(table, row):
+        sid = request.cookies.get("sid")
+        with lock:
+            seen = sessions.get(sid)
+            if seen is not None:
+                sessions[sid] = seen + 1
+        if seen is None or (expire_after and seen >= expire_after):
+            return page("Session", "<h2>Session expired</h2><p>Please sign in again.</p>")
+        if row in error_rows:
+            return page("Record", "<h2>No data</h2>")
+        return page(f"Record {table}-{row}", f"<h1 id=\"record\">Record W{table}-{row:05d}</h1>\n{payload}")
+
+    return site
+
+
+class SiteServer:
+    # Serves a fixture site from a background thread on a free local port
+    def __init__(self, site, host="127.0.0.1", port=0):
+        self.server = make_server(host, port, site, threaded=True)
+        self.url = f"http://{host}:{self.server.server_port}"
+        self._thread = threading.Thread(target=self.server.serve_forever, name="bench-site", daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self._thread.join()
+
+
+if __name__ == '__main__':
+    # Browse the fixture by hand: python bench_site.py, then open /login and /table/1
+    create_site(rows=int(os.environ.get("BENCH_ROWS", 50))).run(port=int(os.environ.get("BENCH_PORT", 5050)))
@@ -0,0 +1,177 @@
+import argparse, contextlib, json, os, sys, tempfile, threading, time
+
+# Offline benchmark: runs the real scrape pipeline with headless Chrome against
+# the local fixture in bench_site.py and prints one JSON result, e.g.
+#   python benchmark.py --rows 200 --workers 2 --latency-ms 50 --output bench.json
+# Everything the run writes goes to a temporary directory.
+
+WORK_DIR = tempfile.mkdtemp(prefix="scrape-bench-")
+for name, value in {
+    "BROWSER_PROFILE": "lean",
+    "MAINTENANCE_WINDOWS": "",
+    "PROXY_FILE": os.path.join(WORK_DIR, "proxies.txt"),
+    "CHECKPOINT_DIR": os.path.join(WORK_DIR, "checkpoints"),
+    "MANIFEST_DIR": os.path.join(WORK_DIR, "manifests"),
+    "SESSION_DIR": os.path.join(WORK_DIR, "sessions"),
+    "TRACE_DIR": os.path.join(WORK_DIR, "traces"),
+}.items():
+    # Set before scraper is imported; an explicit environment still wins
+    os.environ.setdefault(name, value)
+
+import scraper
+import scrape_config
+from bench_site import create_site, SiteServer
+
+
+def process_tree_rss(root_pid):
+    # Resident memory of a process and all its descendants (Chrome, ChromeDriver), Linux only
+    children = {}
+    rss = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+            with open(f"/proc/{entry}/statm") as f:
+                rss[int(entry)] = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except (OSError, ValueError, IndexError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    total, stack = 0, [root_pid]
+    while stack:
+        pid = stack.pop()
+        total += rss.get(pid, 0)
+        stack.extend(children.get(pid, []))
+    return total
+
+
+class RssSampler:
+    def __init__(self, interval=0.25):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.sample()
+            self._stop.wait(self.interval)
+
+    def sample(self):
+        if os.path.isdir("/proc"):
+            self.peak = max(self.peak, process_tree_rss(os.getpid()))
+        else:
+            import resource
+            scale = 1 if sys.platform == "darwin" else 1024  # ru_maxrss is bytes on macOS, KiB elsewhere
+            self.peak = max(self.peak, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.sample()
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))], 4)
+
+
+def row_latencies(trace_path):
+    try:
+        with open(trace_path, encoding="utf-8") as f:
+            events = json.load(f)
+    except (OSError, ValueError):
+        return []
+    return [event["dur"] / 1e6 for event in events if event.get("name") == "row"]
+
+
+def run_benchmark(rows, tables=1, workers=1, latency_ms=0, payload_kb=20, error_rows=(), expire_after=0, adaptive=False):
+    site = create_site(rows=rows, tables=tables, latency_ms=latency_ms, payload_kb=payload_kb,
+                       error_rows=set(error_rows), expire_after=expire_after)
+    job_id = f"bench-{int(time.time())}"
+    save_dir = os.path.join(WORK_DIR, "pdf_output", job_id)
+    os.makedirs(save_dir, exist_ok=True)
+    with SiteServer(site) as server:
+        spec = {
+            "id": job_id,
+            "login_url": server.url + "/login",
+            "table_urls": [f"{server.url}/table/{t}" for t in range(1, tables + 1)],
+            "folder_name": job_id,
+            "save_dir": save_dir,
+            "start_index": 0,
+            "last_index": None,
+            "workers": workers,
+            "shards": workers,
+            "record_selector": "#record",
+            "error_keywords": scrape_config.ERROR_KEYWORDS,
+            "error_container": None,
+            "trace": True,
+            "adaptive": adaptive,
+        }
+        pool = scraper.create_browser_pool()
+        try:
+            with RssSampler() as sampler:
+                # Browsers are launched up front so the timing covers scraping, not Chrome start-up
+                pool.start()
+                job = scraper.build_job(spec, pool, lambda message: None)
+                started = time.monotonic()
+                result = scraper.run_job(job)
+                elapsed = time.monotonic() - started
+        finally:
+            pool.shutdown()
+
+    latencies = row_latencies(job["trace"].path)
+    bytes_written = sum(os.path.getsize(os.path.join(save_dir, name)) for name in os.listdir(save_dir))
+    return {
+        "status": result["status"],
+        "message": result["message"].strip(),
+        "rows": result["rows"],
+        "seconds": round(elapsed, 3),
+        "rows_per_second": round(result["rows"] / elapsed, 3) if elapsed else None,
+        "row_latency_p50": percentile(latencies, 0.50),
+        "row_latency_p95": percentile(latencies, 0.95),
+        "peak_rss_bytes": sampler.peak,
+        "bytes_written": bytes_written,
+        "concurrency": job["concurrency"].snapshot() if job["concurrency"] is not None else None,
+        "config": {
+            "rows": rows, "tables": tables, "workers": workers, "latency_ms": latency_ms,
+            "payload_kb": payload_kb, "error_rows": sorted(error_rows), "expire_after": expire_after, "adaptive": adaptive,
+            "browser_profile": os.environ.get("BROWSER_PROFILE"),
+        },
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the scrape pipeline against a local fixture site")
+    parser.add_argument("--rows", type=int, default=50, help="rows per table")
+    parser.add_argument("--tables", type=int, default=1)
+    parser.add_argument("--workers", type=int, default=1, help="parallel browsers")
+    parser.add_argument("--latency-ms", type=int, default=0, help="server delay per page")
+    parser.add_argument("--payload-kb", type=int, default=20, help="size of each record page")
+    parser.add_argument("--error-row", type=int, action="append", default=[], help="record that shows a 'no data' page")
+    parser.add_argument("--expire-after", type=int, default=0, help="records per session before it expires")
+    parser.add_argument("--adaptive", action="store_true", help="let the AIMD controller pick the number of busy browsers")
+    parser.add_argument("--output", help="also write the JSON result to this file")
+    args = parser.parse_args(argv)
+
+    # The scraper logs to stdout; keep stdout for the JSON result
+    with contextlib.redirect_stdout(sys.stderr):
+        result = run_benchmark(args.rows, args.tables, args.workers, args.latency_ms, args.payload_kb,
+                               args.error_row, args.expire_after, args.adaptive)
+    text = json.dumps(result, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    return 0 if result["status"] == "completed" else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
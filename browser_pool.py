@@ -0,0 +1,198 @@
+import threading, time
+from urllib.parse import urlsplit
+
+
+def _print_log(message, level='INFO'):
+    print(message)
+
+
+class BrowserPool:
+    # Keeps a set of pre-launched Chrome instances around so that back-to-back
+    # jobs can check one out instead of paying the browser cold start.
+    def __init__(self, factory, size=2, min_idle=1, idle_timeout=900, max_rows=500, log=_print_log,
+                 validate=None, on_discard=None):
+        self.factory = factory
+        self.validate = validate        # extra per-checkout check, e.g. the browser's proxy is not quarantined
+        self.on_discard = on_discard    # called with each driver that leaves the pool for good
+        self.size = max(1, size)
+        self.min_idle = max(0, min(min_idle, self.size))
+        self.idle_timeout = idle_timeout
+        self.max_rows = max_rows
+        self.log = log
+        self._cond = threading.Condition()
+        self._idle = []      # entries ready for checkout, most recently used last
+        self._busy = {}      # id(driver) -> entry
+        self._launching = 0
+        self._closed = False
+        self._reaper = None
+
+    def start(self):
+        # Pre-launch the warm set and start the idle reaper
+        for _ in range(self.min_idle):
+            try:
+                entry = self._launch()
+            except Exception as e:
+                self.log(f"Browser pool warm-up failed: {str(e)}", level='WARNING')
+                break
+            with self._cond:
+                self._idle.append(entry)
+        if self._reaper is None:
+            self._reaper = threading.Thread(target=self._reap_loop, name="browser-pool-reaper", daemon=True)
+            self._reaper.start()
+        self.log(f"Browser pool ready ({len(self._idle)} warm, max {self.size})", level='INFO')
+
+    def acquire(self, download_dir, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            entry = None
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise RuntimeError("Browser pool is shut down")
+                    if self._idle:
+                        entry = self._idle.pop()
+                        break
+                    if self._total() < self.size:
+                        self._launching += 1
+                        break
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        raise TimeoutError("No browser available in pool")
+                    self._cond.wait(remaining)
+
+            if entry is None:
+                try:
+                    entry = self._launch()
+                finally:
+                    with self._cond:
+                        self._launching -= 1
+                        self._cond.notify()
+            elif not self._healthy(entry):
+                self.log("Discarding unhealthy pooled browser", level='WARNING')
+                self._quit(entry)
+                with self._cond:
+                    self._cond.notify()
+                continue
+
+            try:
+                self._set_download_dir(entry, download_dir)
+            except Exception:
+                self._quit(entry)
+                with self._cond:
+                    self._cond.notify()
+                continue
+
+            with self._cond:
+                self._busy[id(entry['driver'])] = entry
+            return entry['driver']
+
+    def release(self, driver, rows=0):
+        with self._cond:
+            entry = self._busy.pop(id(driver), None)
+        if entry is None:
+            return
+        entry['rows'] += rows
+        recycle = self.max_rows and entry['rows'] >= self.max_rows
+        if recycle:
+            self.log(f"Recycling browser after {entry['rows']} rows", level='INFO')
+        if recycle or self._closed or not self._reset(entry):
+            self._quit(entry)
+        else:
+            entry['last_used'] = time.monotonic()
+            with self._cond:
+                self._idle.append(entry)
+        with self._cond:
+            self._cond.notify()
+
+    def shutdown(self):
+        with self._cond:
+            self._closed = True
+            entries = self._idle + list(self._busy.values())
+            self._idle = []
+            self._busy = {}
+            self._cond.notify_all()
+        for entry in entries:
+            self._quit(entry)
+
+    def stats(self):
+        with self._cond:
+            return {"idle": len(self._idle), "busy": len(self._busy), "launching": self._launching, "size": self.size}
+
+    def _total(self):
+        return len(self._idle) + len(self._busy) + self._launching
+
+    def _launch(self):
+        started = time.monotonic()
+        driver = self.factory()
+        self.log(f"Launched pooled browser in {time.monotonic() - started:.1f}s", level='INFO')
+        return {"driver": driver, "rows": 0, "last_used": time.monotonic(), "download_dir": None}
+
+    def _healthy(self, entry):
+        try:
+            driver = entry['driver']
+            driver.execute_script("return 1")
+            if self.validate is not None and not self.validate(driver):
+                return False
+            return len(driver.window_handles) > 0
+        except Exception:
+            return False
+
+    def _set_download_dir(self, entry, download_dir):
+        # Chrome only reads download.default_directory at launch, so switch it over CDP
+        if entry['download_dir'] == download_dir:
+            return
+        # Browser-wide, so tabs the job opens later download there too
+        entry['driver'].execute_cdp_cmd("Browser.setDownloadBehavior", {"behavior": "allow", "downloadPath": download_dir})
+        entry['download_dir'] = download_dir
+
+    def _reset(self, entry):
+        # Leave a single blank tab and no login behind, so the next job (maybe
+        # another user's) starts from a clean slate
+        try:
+            driver = entry['driver']
+            handles = driver.window_handles
+            origins = set()
+            for handle in reversed(handles):
+                driver.switch_to.window(handle)
+                parts = urlsplit(driver.current_url)
+                if parts.scheme in ("http", "https"):
+                    origins.add(f"{parts.scheme}://{parts.netloc}")
+                if handle != handles[0]:
+                    driver.close()
+            driver.switch_to.window(handles[0])
+            driver.get("about:blank")
+            driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+            # localStorage, IndexedDB, service workers and caches of the sites the job had open
+            for origin in origins:
+                driver.execute_cdp_cmd("Storage.clearDataForOrigin", {"origin": origin, "storageTypes": "all"})
+            return True
+        except Exception:
+            return False
+
+    def _quit(self, entry):
+        try:
+            entry['driver'].quit()
+        except Exception:
+            pass
+        if self.on_discard is not None:
+            self.on_discard(entry['driver'])
+
+    def _reap_loop(self):
+        interval = max(5, min(60, self.idle_timeout / 4)) if self.idle_timeout else 60
+        while not self._closed:
+            time.sleep(interval)
+            self.evict_idle()
+
+    def evict_idle(self):
+        if not self.idle_timeout:
+            return
+        now = time.monotonic()
+        evicted = []
+        with self._cond:
+            # Oldest entries sit at the front of the idle list
+            while len(self._idle) > self.min_idle and now - self._idle[0]['last_used'] > self.idle_timeout:
+                evicted.append(self._idle.pop(0))
+        for entry in evicted:
+            self._quit(entry)
+        if evicted:
+            self.log(f"Evicted {len(evicted)} idle browser(s) from pool", level='INFO')
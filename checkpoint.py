@@ -0,0 +1,72 @@
+import hashlib, json, os, threading, time
+
+# Journals live outside the PDF folders so they never end up in the ZIP
+CHECKPOINT_DIR = os.environ.get("CHECKPOINT_DIR", os.path.join(os.path.abspath("run_state"), "checkpoints"))
+
+
+def file_digest(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class CheckpointJournal:
+    # Append-only record of every (table URL, row id, filename) that has been
+    # written to disk. Each line is fsynced, so after a crash the journal is at
+    # most one partial line behind the files on disk.
+    def __init__(self, path):
+        self.path = path
+        self.completed = {}
+        self._lock = threading.Lock()
+        self._file = None
+
+    @classmethod
+    def for_folder(cls, folder_name):
+        return cls(os.path.join(CHECKPOINT_DIR, f"{folder_name}.jsonl"))
+
+    def load(self):
+        self.completed = {}
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # Torn final line from a crash mid-write
+                        continue
+                    self.completed[(entry["table"], entry["row"])] = entry
+        except FileNotFoundError:
+            pass
+        return len(self.completed)
+
+    def is_done(self, table_url, row_id, save_dir):
+        entry = self.completed.get((table_url, row_id))
+        if entry is None:
+            return False
+        path = os.path.join(save_dir, entry["file"])
+        try:
+            if os.path.getsize(path) != entry["size"]:
+                return False
+            return file_digest(path) == entry["sha256"]
+        except OSError:
+            return False
+
+    def record(self, job_id, table_url, row_id, filename, size, sha256):
+        entry = {"job": job_id, "table": table_url, "row": row_id, "file": filename, "size": size, "sha256": sha256, "ts": time.time()}
+        line = json.dumps(entry) + "\n"
+        with self._lock:
+            if self._file is None:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write(line)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self.completed[(table_url, row_id)] = entry
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
@@ -0,0 +1,151 @@
+import os, threading, time
+from collections import deque
+
+ADAPTIVE_DECREASE = float(os.environ.get("ADAPTIVE_DECREASE", 0.5))              # factor applied to limit and rate on a cut
+ADAPTIVE_LATENCY_FACTOR = float(os.environ.get("ADAPTIVE_LATENCY_FACTOR", 2.5))  # a row this many times slower than usual is a spike
+ADAPTIVE_RATE_STEP = float(os.environ.get("ADAPTIVE_RATE_STEP", 0.1))            # rows/s added to a rate cap per healthy round
+ADAPTIVE_MIN_RATE = 0.05
+LATENCY_WARMUP = 5  # healthy rows measured before a spike can count
+
+
+class AdaptiveLimit:
+    # AIMD controller for one job's rows against one site. At most `limit`
+    # rows are in flight (workers beyond it wait between rows) and, once the
+    # site has pushed back, row starts are also spaced to `rate` per second.
+    # Each round of healthy rows (one per unit of limit) adds one to the limit
+    # and ADAPTIVE_RATE_STEP to the rate; a throttling page or a timeout
+    # multiplies both by ADAPTIVE_DECREASE. A latency spike is only a hint, so
+    # it cuts the limit alone, and not at all once a single browser is left;
+    # rate caps (which remember_site carries to the next job) come only from
+    # the site pushing back. A limit only grows if workers actually waited on
+    # it during the round, and only rows started after the last cut can cause
+    # another, so one overload counts once.
+    def __init__(self, maximum, initial=1, rate=None, latency=None, on_change=None):
+        self.maximum = max(1, maximum)
+        self.limit = float(min(max(1, initial), self.maximum))
+        self.rate = rate
+        self.latency = latency       # EWMA of row seconds
+        self.samples = LATENCY_WARMUP if latency is not None else 0
+        self.active = 0
+        self.cuts = 0
+        self.last_cut = None
+        self.on_change = on_change
+        self._healthy = 0
+        self._waited = set()  # "limit" and/or "rate": what held a worker back this round
+        self._cut_at = 0.0
+        self._next_start = 0.0
+        self._finished = deque(maxlen=20)  # monotonic times of recent healthy rows
+        self._cond = threading.Condition()
+
+    def acquire(self, running):
+        # Blocks until a row may start and returns its start time, or None once running() is false
+        with self._cond:
+            while running():
+                now = time.monotonic()
+                if self.active >= int(self.limit):
+                    self._waited.add("limit")
+                    wait = 0.5
+                else:
+                    wait = self._next_start - now
+                    if wait <= 0:
+                        self.active += 1
+                        if self.rate is not None:
+                            self._next_start = now + 1 / self.rate
+                        return now
+                    self._waited.add("rate")
+                self._cond.wait(min(wait, 0.5))
+            return None
+
+    def release(self, started, seconds=None, reason=None):
+        # seconds: how long a saved row took; reason: why a failed row counts
+        # against the site ("throttled", "timeout"). Neither just frees the slot.
+        with self._cond:
+            self.active -= 1
+            now = time.monotonic()
+            changed = False
+            if reason is None and seconds is not None:
+                if self.samples >= LATENCY_WARMUP and seconds > ADAPTIVE_LATENCY_FACTOR * self.latency:
+                    reason = "latency"
+                self.latency = seconds if self.latency is None else 0.9 * self.latency + 0.1 * seconds
+                self.samples += 1
+                self._finished.append(now)
+            if reason is not None:
+                if started >= self._cut_at:
+                    changed = self._cut(reason, now)
+            elif seconds is not None:
+                self._healthy += 1
+                if self._healthy >= int(self.limit):
+                    changed = self._grow()
+                    self._healthy = 0
+                    self._waited.clear()
+            self._cond.notify_all()
+            snapshot = self.snapshot() if changed else None
+        if snapshot is not None and self.on_change is not None:
+            self.on_change(snapshot)
+
+    def _throughput(self):
+        if len(self._finished) < 2 or self._finished[-1] <= self._finished[0]:
+            return None
+        return (len(self._finished) - 1) / (self._finished[-1] - self._finished[0])
+
+    def _grow(self):
+        before = (int(self.limit), self.rate)
+        if "limit" in self._waited:
+            self.limit = min(self.maximum, self.limit + 1)
+        if self.rate is not None and "rate" in self._waited:
+            self.rate += ADAPTIVE_RATE_STEP
+            # Lift the cap once it is well above what the workers reach anyway
+            throughput = self._throughput()
+            if throughput is not None and self.rate > 2 * throughput:
+                self.rate = None
+        return (int(self.limit), self.rate) != before
+
+    def _cut(self, reason, now):
+        if reason == "latency" and self.limit < 2:
+            # Slow rows with one browser left: nothing to shed
+            return False
+        self.limit = max(1.0, self.limit * ADAPTIVE_DECREASE)
+        if reason != "latency":
+            base = self.rate if self.rate is not None else self._throughput()
+            if base is None:
+                # Pushed back before anything was measured: start slow and let the rate grow
+                base = 1.0
+            self.rate = max(ADAPTIVE_MIN_RATE, base * ADAPTIVE_DECREASE)
+            self._next_start = max(self._next_start, now + 1 / self.rate)
+        self._cut_at = now
+        self._healthy = 0
+        self._waited.clear()
+        self.cuts += 1
+        self.last_cut = reason
+        return True
+
+    def snapshot(self):
+        return {
+            "limit": int(self.limit),
+            "maxWorkers": self.maximum,
+            "rate": round(self.rate, 3) if self.rate is not None else None,
+            "rowSeconds": round(self.latency, 3) if self.latency is not None else None,
+            "cuts": self.cuts,
+            "lastCut": self.last_cut,
+        }
+
+    def learned(self):
+        with self._cond:
+            return {"initial": int(self.limit), "rate": self.rate, "latency": self.latency}
+
+
+# What the last job against each site ended with, so the next one (in this
+# worker process) starts from there instead of from a single browser
+_sites = {}
+_sites_lock = threading.Lock()
+
+
+def site_limit(site, maximum, on_change=None):
+    with _sites_lock:
+        learned = dict(_sites.get(site) or {})
+    return AdaptiveLimit(maximum, on_change=on_change, **learned)
+
+
+def remember_site(site, limiter):
+    with _sites_lock:
+        _sites[site] = limiter.learned()
@@ -0,0 +1,115 @@
+import json, os, re, subprocess, sys
+
+# Resolved chromedriver path is recorded here so later launches never touch the network
+CACHE_PATH = os.environ.get(
+    "CHROMEDRIVER_CACHE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".chromedriver.json"),
+)
+CHROME_BINARIES = ["google-chrome-stable", "google-chrome", "chromium", "chromium-browser"]
+
+_resolved = None
+
+
+def _read_version(binary):
+    try:
+        output = subprocess.run([binary, "--version"], capture_output=True, text=True, timeout=10).stdout
+    except (OSError, subprocess.SubprocessError):
+        return None
+    match = re.search(r"(\d+\.\d+\.\d+\.\d+)", output)
+    return match.group(1) if match else None
+
+
+def chrome_version():
+    for binary in CHROME_BINARIES:
+        version = _read_version(binary)
+        if version:
+            return version
+    return None
+
+
+def _major(version):
+    return version.split(".")[0] if version else None
+
+
+def load_cache():
+    try:
+        with open(CACHE_PATH) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _cache_valid(cache, browser_version):
+    if not cache:
+        return False
+    path = cache.get("driver_path")
+    if not path or not os.path.isfile(path) or not os.access(path, os.X_OK):
+        return False
+    # Chrome may have been upgraded underneath us; chromedriver must match its major version
+    if browser_version and _major(cache.get("chrome_version")) != _major(browser_version):
+        return False
+    return True
+
+
+def _find_windows_driver(driver_path):
+    # webdriver-manager sometimes returns a sibling file on Windows rather than the exe itself
+    driver_dir = os.path.dirname(driver_path)
+    possible_paths = [
+        os.path.join(driver_dir, 'chromedriver.exe'),
+        os.path.join(driver_dir, 'chromedriver-win32', 'chromedriver.exe'),
+        os.path.join(driver_dir, 'chromedriver-win64', 'chromedriver.exe')
+    ]
+    for path in possible_paths:
+        if os.path.exists(path):
+            return path
+    raise Exception(f"Could not find chromedriver.exe in {driver_dir}")
+
+
+def download_chromedriver(browser_version):
+    # The only code path that needs network access
+    from webdriver_manager.chrome import ChromeDriverManager
+    driver_path = ChromeDriverManager().install()
+    if os.name == 'nt' and not driver_path.endswith('chromedriver.exe'):
+        driver_path = _find_windows_driver(driver_path)
+
+    driver_version = _read_version(driver_path)
+    if browser_version and driver_version and _major(driver_version) != _major(browser_version):
+        raise Exception(f"ChromeDriver {driver_version} does not match Chrome {browser_version}")
+
+    cache = {"driver_path": driver_path, "driver_version": driver_version, "chrome_version": browser_version}
+    tmp_path = CACHE_PATH + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(cache, f, indent=2)
+    os.replace(tmp_path, CACHE_PATH)
+    return cache
+
+
+def resolve_chromedriver(offline=None):
+    global _resolved
+    if _resolved:
+        return _resolved
+
+    explicit = os.environ.get("CHROMEDRIVER_PATH")
+    if explicit:
+        _resolved = explicit
+        return _resolved
+
+    if offline is None:
+        offline = os.environ.get("CHROMEDRIVER_OFFLINE", "").lower() in ("1", "true", "yes")
+
+    browser_version = chrome_version()
+    cache = load_cache()
+    if not _cache_valid(cache, browser_version):
+        if offline:
+            raise Exception(f"No usable ChromeDriver recorded in {CACHE_PATH} for Chrome {browser_version} (offline mode)")
+        cache = download_chromedriver(browser_version)
+
+    _resolved = cache["driver_path"]
+    return _resolved
+
+
+if __name__ == '__main__':
+    # Run at image build time / first boot to populate the cache
+    path = resolve_chromedriver(offline=False)
+    print(f"ChromeDriver resolved to {path} (cache: {CACHE_PATH})")
+    sys.exit(0)
@@ -0,0 +1,362 @@
+import hashlib, json, os, threading, time
+from selenium.common import exceptions as selenium_exceptions
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.remote.webelement import WebElement
+
+# Record every WebDriver/CDP call of a real run, then serve the recording back
+# through the same driver interface with no browser and no network:
+#   DRIVER_RECORD_DIR=recordings/site python app.py      record a live run
+#   DRIVER_REPLAY_DIR=recordings/site python app.py      replay it
+# A recording holds one session-NNNN.jsonl per browser launched, one line per
+# call (offset, duration, arguments, result or error), and a blobs/ directory
+# with long values (page sources, PDF chunks) stored once by content hash.
+# While recording or replaying, jobs run with a single browser (see
+# scraper.build_job): with several, work stealing hands rows to browsers in a
+# timing-dependent order and a replay could not follow the recorded calls.
+DRIVER_RECORD_DIR = os.environ.get("DRIVER_RECORD_DIR")
+DRIVER_REPLAY_DIR = os.environ.get("DRIVER_REPLAY_DIR")
+DRIVER_REPLAY_SPEED = float(os.environ.get("DRIVER_REPLAY_SPEED", 1))  # 1 = recorded timing, 10 = ten times faster, 0 = no waiting
+BLOB_MIN_CHARS = 4096
+# Reads the scraper repeats until something changes; how often depends on
+# timing, so a replay may ask for them more or fewer times than recorded
+POLL_COMMANDS = {"get_log", "find_elements", "window_handles", "current_window_handle", "page_source"}
+POLL_SCRIPTS = {"return document.readyState", "return 1"}
+
+
+class ReplayMismatch(WebDriverException):
+    # The run asked for something the recording does not have at this point
+    pass
+
+
+def command_key(command, args):
+    # Calls match on what they do, not their arguments: row ids, handles and
+    # URLs legitimately differ when several workers claim rows in another order
+    if command == "execute_script":
+        return command, hashlib.sha1(args[0].encode("utf-8")).hexdigest()[:12]
+    if command == "execute_cdp_cmd":
+        return command, args[0]
+    return command,
+
+
+def describe_call(command, args):
+    if command == "execute_cdp_cmd":
+        return f"{command} {args[0]}"
+    if command == "execute_script":
+        return f"{command} {args[0].strip().splitlines()[0][:40]!r}"
+    return command
+
+
+def is_poll(command, args):
+    return command in POLL_COMMANDS or (command == "execute_script" and args[0] in POLL_SCRIPTS)
+
+
+class BlobStore:
+    def __init__(self, directory):
+        self.directory = os.path.join(directory, "blobs")
+
+    def put(self, text):
+        digest = hashlib.sha1(text.encode("utf-8")).hexdigest()
+        path = os.path.join(self.directory, digest)
+        if not os.path.exists(path):
+            os.makedirs(self.directory, exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(tmp_path, path)
+        return digest
+
+    def get(self, digest):
+        with open(os.path.join(self.directory, digest), encoding="utf-8") as f:
+            return f.read()
+
+    def pack(self, value):
+        # JSON-safe copy of a call's arguments or result
+        if isinstance(value, str):
+            return {"$blob": self.put(value)} if len(value) >= BLOB_MIN_CHARS else value
+        if isinstance(value, WebElement):
+            return {"$element": True}
+        if isinstance(value, (list, tuple)):
+            return [self.pack(v) for v in value]
+        if isinstance(value, dict):
+            return {str(k): self.pack(v) for k, v in value.items()}
+        if value is None or isinstance(value, (bool, int, float)):
+            return value
+        return repr(value)
+
+    def unpack(self, value):
+        if isinstance(value, list):
+            return [self.unpack(v) for v in value]
+        if isinstance(value, dict):
+            if "$blob" in value:
+                return self.get(value["$blob"])
+            if "$element" in value:
+                return ReplayElement()
+            return {k: self.unpack(v) for k, v in value.items()}
+        return value
+
+
+class DriverRecorder:
+    # Wraps each browser the pool launches; every wrapped browser writes its own session file
+    def __init__(self, directory):
+        self.directory = directory
+        self.blobs = BlobStore(directory)
+        self._lock = threading.Lock()
+        self._sessions = 0
+
+    def wrap(self, driver):
+        os.makedirs(self.directory, exist_ok=True)
+        while True:
+            with self._lock:
+                self._sessions += 1
+                path = os.path.join(self.directory, f"session-{self._sessions:04d}.jsonl")
+            try:
+                # Exclusive create: other worker processes, or an earlier run, may own this number
+                session_file = open(path, "x", encoding="utf-8")
+            except FileExistsError:
+                continue
+            return RecordingDriver(driver, session_file, self.blobs)
+
+
+class RecordingDriver:
+    def __init__(self, driver, session_file, blobs):
+        self._driver = driver
+        self._blobs = blobs
+        self._file = session_file
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self.switch_to = _RecordingSwitchTo(self)
+
+    def _call(self, command, args, invoke, page=False):
+        started = time.monotonic()
+        entry = {"at": round(started - self._started, 6), "cmd": command, "args": self._blobs.pack(list(args))}
+        try:
+            result = invoke()
+        except Exception as e:
+            entry["dur"] = round(time.monotonic() - started, 6)
+            entry["error"] = {"type": type(e).__name__, "message": getattr(e, "msg", None) or str(e)}
+            self._write(entry)
+            raise
+        entry["dur"] = round(time.monotonic() - started, 6)
+        entry["result"] = self._blobs.pack(result)
+        if page:
+            # Page content as the browser saw it, kept alongside for inspection and page_source
+            try:
+                entry["page"] = self._blobs.put(self._driver.page_source)
+            except Exception:
+                pass
+        self._write(entry)
+        return result
+
+    def _write(self, entry):
+        line = json.dumps(entry, separators=(",", ":"))
+        with self._lock:
+            if not self._file.closed:
+                self._file.write(line + "\n")
+                self._file.flush()
+
+    def get(self, url):
+        return self._call("get", [url], lambda: self._driver.get(url), page=True)
+
+    def execute_script(self, script, *args):
+        return self._call("execute_script", [script, *args], lambda: self._driver.execute_script(script, *args))
+
+    def execute_cdp_cmd(self, cmd, cmd_args):
+        # Snapshot the record page as it was printed
+        return self._call("execute_cdp_cmd", [cmd, cmd_args], lambda: self._driver.execute_cdp_cmd(cmd, cmd_args),
+                          page=cmd == "Page.printToPDF")
+
+    def quit(self):
+        try:
+            return self._call("quit", [], self._driver.quit)
+        finally:
+            with self._lock:
+                self._file.close()
+
+    def __getattr__(self, name):
+        if callable(getattr(type(self._driver), name, None)):
+            method = getattr(self._driver, name)
+            return lambda *args: self._call(name, args, lambda: method(*args))
+        # Properties such as window_handles are a round trip to the browser too
+        return self._call(name, [], lambda: getattr(self._driver, name))
+
+
+class _RecordingSwitchTo:
+    def __init__(self, recorder):
+        self._recorder = recorder
+
+    def window(self, handle):
+        recorder = self._recorder
+        return recorder._call("switch_to.window", [handle], lambda: recorder._driver.switch_to.window(handle))
+
+
+class ReplayElement:
+    # Stands in for a WebElement; the scraper only ever counts them
+    text = ""
+
+
+class ReplaySource:
+    # The recorded sessions of one recording. Browsers are not tied to a session
+    # when they launch: the pool may start several, and which one a job picks
+    # up depends on timing, so each replayed browser follows every unclaimed
+    # session its calls still match and claims one once the others have diverged.
+    def __init__(self, directory, speed=DRIVER_REPLAY_SPEED):
+        self.blobs = BlobStore(directory)
+        self.speed = speed
+        self._lock = threading.Lock()
+        self._sessions = {}
+        self._claimed = {}  # session name -> ReplayDriver
+        for name in sorted(os.listdir(directory)):
+            if name.startswith("session-") and name.endswith(".jsonl"):
+                with open(os.path.join(directory, name), encoding="utf-8") as f:
+                    self._sessions[name] = [json.loads(line) for line in f if line.strip()]
+        if not self._sessions:
+            raise ValueError(f"No recorded sessions in {directory}")
+
+    def open(self):
+        with self._lock:
+            names = [name for name in self._sessions if name not in self._claimed]
+        if not names:
+            raise WebDriverException("Recording has no more browser sessions to replay")
+        return ReplayDriver(self, {name: ReplayCursor(name, self._sessions[name]) for name in names})
+
+    def claim(self, name, driver):
+        # False if another browser already follows this session
+        with self._lock:
+            return self._claimed.setdefault(name, driver) is driver
+
+    def claimed_by_other(self, name, driver):
+        with self._lock:
+            return self._claimed.get(name, driver) is not driver
+
+
+class ReplayCursor:
+    # Position in one recorded session
+    def __init__(self, name, entries):
+        self.name = name
+        self.entries = entries
+        self.position = 0
+        self.last = {}  # command key -> last served entry, for repeated polls
+
+    def next(self, command, args):
+        key = command_key(command, args)
+        position = self.position
+        while position < len(self.entries):
+            entry = self.entries[position]
+            if command_key(entry["cmd"], entry["args"]) == key:
+                self.position = position + 1
+                self.last[key] = entry
+                return entry
+            if not is_poll(entry["cmd"], entry["args"]):
+                break
+            # A poll the live run no longer needs, e.g. the page was ready sooner
+            position += 1
+        if is_poll(command, args) and key in self.last:
+            # One more poll than recorded: the answer has not changed, and log
+            # reads return only new entries
+            entry = self.last[key]
+            return dict(entry, dur=0, result=[] if command == "get_log" else entry.get("result"))
+        if command == "quit":
+            return {"dur": 0, "result": None}
+        expected = describe_call(self.entries[position]["cmd"], self.entries[position]["args"]) if position < len(self.entries) else "end of recording"
+        raise ReplayMismatch(f"{self.name}: replay expected {expected} at call {position + 1}, got {describe_call(command, args)}")
+
+
+class ReplayDriver:
+    def __init__(self, source, cursors):
+        self._source = source
+        self._cursors = cursors  # session name -> ReplayCursor, narrowed down call by call
+        self._page = ""
+        self._lock = threading.Lock()
+        self.switch_to = _ReplaySwitchTo(self)
+
+    @property
+    def session(self):
+        return next(iter(self._cursors)) if len(self._cursors) == 1 else None
+
+    def _serve(self, command, args):
+        with self._lock:
+            entry = self._advance(command, args)
+            if entry.get("page"):
+                self._page = entry["page"]
+        if self._source.speed and entry["dur"]:
+            time.sleep(entry["dur"] / self._source.speed)
+        if "error" in entry:
+            error = getattr(selenium_exceptions, entry["error"]["type"], None)
+            if not (isinstance(error, type) and issubclass(error, Exception)):
+                error = WebDriverException
+            raise error(entry["error"]["message"])
+        return self._source.blobs.unpack(entry.get("result"))
+
+    def _advance(self, command, args):
+        served, mismatch = None, None
+        for name, cursor in list(self._cursors.items()):
+            if self._source.claimed_by_other(name, self):
+                del self._cursors[name]
+                continue
+            try:
+                entry = cursor.next(command, args)
+            except ReplayMismatch as e:
+                mismatch = mismatch or e
+                if not is_poll(command, args):
+                    # Polls such as the pool's health check come and go with timing; they never rule a session out
+                    del self._cursors[name]
+                continue
+            # While several sessions still match, answer from the first one
+            served = served or entry
+        if served is None:
+            raise mismatch or ReplayMismatch(f"No unclaimed recorded session matches {describe_call(command, args)}")
+        if len(self._cursors) == 1 and not self._source.claim(self.session, self):
+            raise ReplayMismatch(f"{self.session} is already replayed by another browser")
+        return served
+
+    def get(self, url):
+        return self._serve("get", [url])
+
+    def execute_script(self, script, *args):
+        return self._serve("execute_script", [script, *args])
+
+    def execute_cdp_cmd(self, cmd, cmd_args):
+        return self._serve("execute_cdp_cmd", [cmd, cmd_args])
+
+    def get_log(self, log_type):
+        return self._serve("get_log", [log_type])
+
+    def find_elements(self, by, value):
+        return self._serve("find_elements", [by, value])
+
+    def close(self):
+        return self._serve("close", [])
+
+    def refresh(self):
+        return self._serve("refresh", [])
+
+    def quit(self):
+        return self._serve("quit", [])
+
+    @property
+    def window_handles(self):
+        return self._serve("window_handles", [])
+
+    @property
+    def current_window_handle(self):
+        return self._serve("current_window_handle", [])
+
+    @property
+    def current_url(self):
+        return self._serve("current_url", [])
+
+    @property
+    def page_source(self):
+        return self._source.blobs.get(self._page) if self._page else ""
+
+
+class _ReplaySwitchTo:
+    def __init__(self, replay):
+        self._replay = replay
+
+    def window(self, handle):
+        return self._replay._serve("switch_to.window", [handle])
+
+
+driver_recorder = DriverRecorder(DRIVER_RECORD_DIR) if DRIVER_RECORD_DIR else None
+replay_source = ReplaySource(DRIVER_REPLAY_DIR) if DRIVER_REPLAY_DIR else None
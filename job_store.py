@@ -0,0 +1,252 @@
+import json, os, sqlite3, threading, time, uuid
+from jobs import TERMINAL_STATUSES, new_record
+
+# Shared job state for serve.py: the job runner writes records and log lines
+# here, and every web worker process answers /jobs and /stream from it
+JOB_STORE = os.environ.get("JOB_STORE", os.path.join(os.path.abspath("run_state"), "jobs.sqlite3"))
+STORE_POLL_SECONDS = float(os.environ.get("STORE_POLL_SECONDS", 0.25))  # how often a /stream looks for new lines
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    seq INTEGER NOT NULL,
+    record TEXT NOT NULL,
+    spec TEXT NOT NULL,
+    status TEXT NOT NULL,
+    pending INTEGER NOT NULL DEFAULT 0,     -- submitted by a web worker, not yet taken by the runner
+    abort INTEGER NOT NULL DEFAULT 0,       -- abort requested by a web worker
+    log_closed INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS logs (
+    job_id TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    message TEXT NOT NULL,
+    PRIMARY KEY (job_id, id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+class JobStore:
+    # SQLite in WAL mode: one writer at a time across processes, readers never
+    # blocked. Each thread gets its own connection.
+    def __init__(self, path=JOB_STORE, log_capacity=2000, history=100):
+        self.path = path
+        self.log_capacity = log_capacity
+        self.history = history
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db().executescript(SCHEMA)
+
+    def _db(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def _transaction(self):
+        return _Transaction(self._db())
+
+    def add(self, record, spec, pending=False):
+        with self._transaction() as db:
+            seq = db.execute("SELECT COALESCE(MAX(seq), 0) + 1 FROM jobs").fetchone()[0]
+            db.execute(
+                "INSERT INTO jobs (id, seq, record, spec, status, pending) VALUES (?, ?, ?, ?, ?, ?)",
+                (record["id"], seq, json.dumps(record), json.dumps(spec), record["status"], int(pending)),
+            )
+
+    def get(self, job_id):
+        row = self._db().execute("SELECT record FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def spec(self, job_id):
+        row = self._db().execute("SELECT spec FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def list(self):
+        rows = self._db().execute("SELECT record FROM jobs ORDER BY seq DESC").fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def latest(self):
+        row = self._db().execute("SELECT id FROM jobs ORDER BY seq DESC LIMIT 1").fetchone()
+        return row[0] if row else None
+
+    def unfinished(self):
+        # Jobs a previous runner accepted but never finished, oldest first
+        placeholders = ",".join("?" * len(TERMINAL_STATUSES))
+        rows = self._db().execute(
+            f"SELECT record, spec FROM jobs WHERE pending = 0 AND status NOT IN ({placeholders}) ORDER BY seq",
+            TERMINAL_STATUSES,
+        ).fetchall()
+        return [(json.loads(record), json.loads(spec)) for record, spec in rows]
+
+    def take_submissions(self):
+        with self._transaction() as db:
+            rows = db.execute("SELECT record, spec FROM jobs WHERE pending = 1 ORDER BY seq").fetchall()
+            db.execute("UPDATE jobs SET pending = 0 WHERE pending = 1")
+        return [(json.loads(record), json.loads(spec)) for record, spec in rows]
+
+    def request_abort(self, job_id):
+        with self._transaction() as db:
+            db.execute("UPDATE jobs SET abort = 1 WHERE id = ?", (job_id,))
+
+    def take_aborts(self):
+        with self._transaction() as db:
+            rows = db.execute("SELECT id FROM jobs WHERE abort = 1").fetchall()
+            db.execute("UPDATE jobs SET abort = 0 WHERE abort = 1")
+        return [row[0] for row in rows]
+
+    def sync(self, records, lines):
+        # One write transaction for everything the runner changed since the last
+        # sync: job records, and log lines as (job_id, message) in order
+        with self._transaction() as db:
+            for record in records:
+                closed = int(record["status"] in TERMINAL_STATUSES)
+                db.execute(
+                    "UPDATE jobs SET record = ?, status = ?, log_closed = MAX(log_closed, ?) WHERE id = ?",
+                    (json.dumps(record), record["status"], closed, record["id"]),
+                )
+            next_ids = {}
+            for job_id, message in lines:
+                if job_id not in next_ids:
+                    next_ids[job_id] = db.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM logs WHERE job_id = ?", (job_id,)).fetchone()[0]
+                db.execute("INSERT INTO logs (job_id, id, message) VALUES (?, ?, ?)", (job_id, next_ids[job_id], message))
+                next_ids[job_id] += 1
+            for job_id, next_id in next_ids.items():
+                db.execute("DELETE FROM logs WHERE job_id = ? AND id < ?", (job_id, next_id - self.log_capacity))
+            if records:
+                self._trim(db)
+
+    def _trim(self, db):
+        # Forget the oldest finished jobs beyond the history limit
+        placeholders = ",".join("?" * len(TERMINAL_STATUSES))
+        stale = db.execute(
+            f"SELECT id FROM jobs WHERE status IN ({placeholders}) AND seq <= "
+            "(SELECT COALESCE(MAX(seq), 0) FROM jobs) - ?",
+            TERMINAL_STATUSES + (self.history,),
+        ).fetchall()
+        for (job_id,) in stale:
+            db.execute("DELETE FROM logs WHERE job_id = ?", (job_id,))
+            db.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+
+    def read_logs(self, job_id, after_id, limit=None):
+        # Same contract as LogChannel.read, without the wait
+        db = self._db()
+        db.execute("BEGIN")  # one snapshot for the three reads
+        try:
+            job = db.execute("SELECT log_closed FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if job is None:
+                return [], 0, True
+            first_id, last_id = db.execute("SELECT MIN(id), MAX(id) FROM logs WHERE job_id = ?", (job_id,)).fetchone()
+            closed = bool(job[0])
+            if last_id is None or last_id <= after_id:
+                return [], 0, closed
+            entries = db.execute(
+                "SELECT id, message FROM logs WHERE job_id = ? AND id > ? ORDER BY id LIMIT ?",
+                (job_id, after_id, limit or -1),
+            ).fetchall()
+        finally:
+            db.execute("COMMIT")
+        dropped = max(0, first_id - after_id - 1)
+        return entries, dropped, closed and entries[-1][0] == last_id
+
+    def get_meta(self, key):
+        row = self._db().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key, value):
+        with self._transaction() as db:
+            db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+
+class _Transaction:
+    # BEGIN IMMEDIATE takes the write lock up front, so read-then-write cannot race another process
+    def __init__(self, db):
+        self.db = db
+
+    def __enter__(self):
+        self.db.execute("BEGIN IMMEDIATE")
+        return self.db
+
+    def __exit__(self, exc_type, exc, tb):
+        self.db.execute("COMMIT" if exc_type is None else "ROLLBACK")
+
+
+class StoreLogChannel:
+    # LogChannel look-alike that tails a job's lines in the store
+    def __init__(self, store, job_id):
+        self.store = store
+        self.job_id = job_id
+
+    def read(self, after_id, timeout=None, limit=None):
+        deadline = time.monotonic() + (timeout or 0)
+        while True:
+            entries, dropped, closed = self.store.read_logs(self.job_id, after_id, limit)
+            remaining = deadline - time.monotonic()
+            if entries or closed or remaining <= 0:
+                return entries, dropped, closed
+            time.sleep(min(STORE_POLL_SECONDS, remaining))
+
+
+class JobBoard:
+    # What a web worker process under serve.py uses in place of JobSupervisor:
+    # the same calls, answered from the store. New jobs and abort requests are
+    # left in the store for the runner in the serve.py parent process.
+    def __init__(self, store, calendar=None):
+        self.store = store
+        self.calendar = calendar
+
+    def start(self):
+        pass
+
+    def shutdown(self):
+        pass
+
+    def submit(self, spec):
+        # None while the server drains for shutdown
+        if self.store.get_meta("draining") == "1":
+            return None
+        job_id = uuid.uuid4().hex[:12]
+        spec = dict(spec, id=job_id)
+        record = new_record(spec)
+        until = self.calendar.maintenance_until(time.time()) if self.calendar else None
+        if until is not None:
+            record.update(status="deferred", startAt=until)
+        self.store.add(record, spec, pending=True)
+        return record
+
+    def resubmit(self, job_id, **changes):
+        spec = self.store.spec(job_id)
+        if spec is None:
+            return None
+        return self.submit(dict(spec, **changes))
+
+    def get(self, job_id):
+        return self.store.get(job_id)
+
+    def list(self):
+        return self.store.list()
+
+    def latest(self):
+        return self.store.latest()
+
+    def abort(self, job_id):
+        record = self.store.get(job_id)
+        if record is None:
+            return False
+        if record["status"] not in TERMINAL_STATUSES:
+            self.store.request_abort(job_id)
+        return True
+
+    def log_channel(self, job_id):
+        return StoreLogChannel(self.store, job_id) if self.store.get(job_id) is not None else None
+
+    def metrics_text(self):
+        # Rendered by the runner every few seconds
+        return self.store.get_meta("metrics") or ""
@@ -0,0 +1,56 @@
+import json, os, threading, time
+
+TRACE_DIR = os.environ.get("TRACE_DIR", os.path.join(os.path.abspath("run_state"), "traces"))
+
+
+class JobTrace:
+    # Per-job span recorder in Chrome trace-event format (JSON array form), for
+    # chrome://tracing or Perfetto. Spans are appended as they finish, so a
+    # trace of a running or crashed job is still readable: the closing bracket
+    # is optional in that format.
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = None
+        self._threads = {}
+        self._origin = time.monotonic()
+
+    @classmethod
+    def for_job(cls, job_id):
+        return cls(os.path.join(TRACE_DIR, f"{job_id}.json"))
+
+    def span(self, name, started, ended, **args):
+        # started/ended are time.monotonic() values
+        event = {
+            "name": name,
+            "cat": "scrape",
+            "ph": "X",
+            "ts": round((started - self._origin) * 1e6, 1),
+            "dur": round((ended - started) * 1e6, 1),
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+            "args": args,
+        }
+        with self._lock:
+            self._write(event)
+
+    def _write(self, event):
+        if self._file is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._file = open(self.path, "w", encoding="utf-8")
+            self._file.write("[\n")
+        tid = event["tid"]
+        if tid not in self._threads:
+            # Name the track after the worker thread
+            self._threads[tid] = threading.current_thread().name
+            self._file.write(json.dumps({"name": "thread_name", "ph": "M", "pid": event["pid"], "tid": tid, "args": {"name": self._threads[tid]}}) + ",\n")
+        self._file.write(json.dumps(event) + ",\n")
+        self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                # A trailing metadata event keeps the array valid JSON after the last comma
+                self._file.write(json.dumps({"name": "process_name", "ph": "M", "pid": os.getpid(), "args": {"name": "scrape worker"}}) + "\n]\n")
+                self._file.close()
+                self._file = None
@@ -0,0 +1,418 @@
+import json, multiprocessing, os, signal, threading, time, uuid
+from collections import deque
+from log_hub import LogHub
+from metrics import MetricsRegistry
+
+TERMINAL_STATUSES = ("completed", "failed", "aborted")
+METRICS_FLUSH_SECONDS = float(os.environ.get("METRICS_FLUSH_SECONDS", 2))
+STORE_SYNC_SECONDS = float(os.environ.get("STORE_SYNC_SECONDS", 0.2))  # how often the runner writes to the shared job store
+WORKER_CHECK_SECONDS = 2  # how often the supervisor looks for dead worker processes
+
+
+def new_record(spec):
+    return {
+        "id": spec["id"],
+        "status": "queued",
+        "folderName": spec.get("folder_name"),
+        "tables": len(spec.get("table_urls", [])),
+        "workers": spec.get("workers"),
+        "resume": spec.get("resume", False),
+        "incremental": spec.get("incremental", False),
+        "archive": spec.get("archive", False),
+        "trace": spec.get("trace", False),
+        "adaptive": spec.get("adaptive", False),
+        "submitted": time.time(),
+        "started": None,
+        "finished": None,
+        "worker": None,
+        "rows": 0,
+        "message": None,
+        "proxies": None,
+        "startAt": None,
+        "pausedUntil": None,
+        "concurrency": None,  # current adaptive limits while the job runs
+    }
+
+
+def worker_main(worker_id, job_queue, control_queue, event_queue):
+    # Long-lived worker process: owns a warm browser pool and runs one job at a time
+    import scraper
+
+    # Ctrl-C in a terminal reaches the whole process group; the parent decides
+    # whether running jobs are drained or stopped
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    pool = scraper.create_browser_pool()
+    pool.start()
+    # pending: the job taken off the queue, from then until it finishes
+    state = {"job": None, "pending": None, "aborted": set()}
+    lock = threading.Lock()
+
+    def listen():
+        while True:
+            command, job_id = control_queue.get()
+            if command == "stop":
+                break
+            if command == "abort":
+                with lock:
+                    if job_id != state["pending"]:
+                        # Already finished here; nothing to remember
+                        continue
+                    state["aborted"].add(job_id)
+                    job = state["job"]
+                if job is not None and job["id"] == job_id:
+                    scraper.abort_job(job)
+
+    def flush_metrics():
+        # Ship this process's measurements to the supervisor, which serves /metrics
+        for state_name, count in pool.stats().items():
+            if state_name != "size":
+                scraper.metrics.set("scraper_browser_pool_browsers", count, worker=str(worker_id + 1), state=state_name)
+        event_queue.put(("metrics", None, scraper.metrics.drain()))
+
+    def report_metrics():
+        while True:
+            time.sleep(METRICS_FLUSH_SECONDS)
+            flush_metrics()
+
+    threading.Thread(target=listen, name="job-control", daemon=True).start()
+    threading.Thread(target=report_metrics, name="job-metrics", daemon=True).start()
+
+    while True:
+        spec = job_queue.get()
+        if spec is None:
+            break
+        job_id = spec["id"]
+        with lock:
+            state["pending"] = job_id
+        # An abort that came in while the job was queued is sent back here once the supervisor sees this
+        event_queue.put(("started", job_id, worker_id))
+        job = None
+        try:
+            job = scraper.build_job(
+                spec,
+                pool,
+                lambda message, job_id=job_id: event_queue.put(("log", job_id, message)),
+                lambda rows, job_id=job_id: event_queue.put(("progress", job_id, rows)),
+                lambda changes, job_id=job_id: event_queue.put(("update", job_id, changes)),
+            )
+            with lock:
+                state["job"] = job
+                aborted = job_id in state["aborted"]
+            if aborted:
+                # The abort arrived between dequeuing the job and registering it
+                scraper.abort_job(job)
+            result = scraper.run_job(job)
+        except Exception as e:
+            # A bad spec must fail its job, not take the worker process down with it
+            result = {"status": "failed", "message": f" Error: {str(e)}", "rows": job["rows_saved"] if job is not None else 0}
+        with lock:
+            state["job"] = None
+            state["pending"] = None
+            state["aborted"].discard(job_id)
+        flush_metrics()
+        # Gauges are shipped on every flush; stop sending this job's so the supervisor can forget them
+        scraper.metrics.forget(job=job_id)
+        event_queue.put(("finished", job_id, result))
+
+    pool.shutdown()
+
+
+class JobSupervisor:
+    # Queues scrape jobs and runs them in isolated worker processes. Job records
+    # and log lines flow back over an event queue and are kept here, in the web
+    # process, for the status and stream endpoints. Jobs submitted during a
+    # maintenance window are held back until it ends.
+    def __init__(self, processes=2, history=100, log_capacity=2000, calendar=None, worker=worker_main, store=None):
+        self.processes = max(1, processes)
+        self.worker = worker  # process entry point; loadtest.py swaps in a stub that needs no browser
+        # Optional JobStore (serve.py): records and log lines are mirrored into it,
+        # and jobs and abort requests from the web worker processes are read from it
+        self.store = store
+        self._outbox = []  # (job_id, log line) not yet written to the store
+        self._draining = False
+        self.history = history
+        self.logs = LogHub(log_capacity)
+        self.metrics = MetricsRegistry()
+        self._ctx = multiprocessing.get_context("spawn")
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._order = deque()
+        self._specs = {}
+        self._deferred = {}  # job_id -> spec waiting for the maintenance window to end
+        self._wakeup = threading.Condition(self._lock)
+        self.calendar = calendar
+        self._workers = []
+        self._job_queue = None
+        self._event_queue = None
+        self._started = False
+        self._stopping = False
+
+    def start(self):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+            self._job_queue = self._ctx.Queue()
+            self._event_queue = self._ctx.Queue()
+            for worker_id in range(self.processes):
+                self._workers.append(self._spawn(worker_id))
+        threading.Thread(target=self._consume_events, name="job-events", daemon=True).start()
+        threading.Thread(target=self._release_deferred, name="job-scheduler", daemon=True).start()
+        threading.Thread(target=self._watch_workers, name="job-watchdog", daemon=True).start()
+        if self.store is not None:
+            self._recover()
+            threading.Thread(target=self._sync_store, name="job-store", daemon=True).start()
+
+    def _spawn(self, worker_id):
+        control_queue = self._ctx.Queue()
+        process = self._ctx.Process(
+            target=self.worker,
+            args=(worker_id, self._job_queue, control_queue, self._event_queue),
+            name=f"scrape-worker-{worker_id + 1}",
+            daemon=True,
+        )
+        process.start()
+        return process, control_queue
+
+    def _watch_workers(self):
+        # A worker process that dies (crash, OOM kill) is replaced; the job it
+        # was running is failed so it can be resumed rather than hang as "running"
+        while not self._stopping:
+            time.sleep(WORKER_CHECK_SECONDS)
+            for worker_id, (process, _) in enumerate(list(self._workers)):
+                if self._stopping or process.is_alive():
+                    continue
+                with self._lock:
+                    for record in self._jobs.values():
+                        if record["status"] == "running" and record["worker"] == worker_id:
+                            message = f" Error: worker process exited unexpectedly (code {process.exitcode}); resume the job to continue"
+                            self._publish(record["id"], message.strip())
+                            self._finish(record, {"status": "failed", "message": message, "rows": record["rows"]})
+                    self._workers[worker_id] = self._spawn(worker_id)
+                print(f"[WARNING] Scrape worker {worker_id + 1} exited with code {process.exitcode}; restarted")
+
+    def _recover(self):
+        # Pick up where the previous runner stopped: waiting jobs are queued
+        # again, jobs that were mid-run are marked failed so they can be resumed
+        self.store.set_meta("draining", "0")
+        for record, spec in self.store.unfinished():
+            if record["status"] in ("queued", "deferred"):
+                self._accept(record, spec)
+            else:
+                record.update(status="failed", message=" Error: interrupted by a server restart; resume the job to continue", finished=time.time())
+                self.store.sync([record], [(record["id"], record["message"].strip())])
+
+    def drain(self, timeout=None):
+        # Stop taking new jobs and wait for queued and running ones to finish;
+        # after timeout they are aborted. Deferred jobs stay in the store for the next start.
+        self._draining = True
+        if self.store is not None:
+            self.store.set_meta("draining", "1")
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._active():
+            if deadline is not None and time.monotonic() >= deadline:
+                for job_id in self._active():
+                    self.abort(job_id)
+                # Aborted jobs stop at the next row boundary
+                give_up = time.monotonic() + 60
+                while self._active() and time.monotonic() < give_up:
+                    time.sleep(0.5)
+                break
+            time.sleep(0.5)
+        if self.store is not None:
+            # Let the last records and log lines reach the store
+            time.sleep(STORE_SYNC_SECONDS * 2)
+        return not self._active()
+
+    def _active(self):
+        with self._lock:
+            return [job_id for job_id, record in self._jobs.items() if record["status"] in ("queued", "running")]
+
+    def shutdown(self):
+        if not self._started:
+            return
+        self._stopping = True
+        for process, control_queue in self._workers:
+            control_queue.put(("stop", None))
+            self._job_queue.put(None)
+        for process, _ in self._workers:
+            process.join(timeout=10)
+
+    def submit(self, spec):
+        job_id = uuid.uuid4().hex[:12]
+        spec = dict(spec, id=job_id)
+        record = new_record(spec)
+        if self.store is not None:
+            # Taken up by _sync_store, the same way as jobs submitted by the web workers
+            self.start()
+            self.store.add(record, spec, pending=True)
+            return record
+        return self._accept(record, spec)
+
+    def _accept(self, record, spec):
+        self.start()
+        job_id = record["id"]
+        record.update(status="queued", startAt=None)
+        until = self.calendar.maintenance_until(time.time()) if self.calendar else None
+        with self._lock:
+            self._jobs[job_id] = record
+            self._specs[job_id] = spec
+            self._order.append(job_id)
+            self.logs.open(job_id)
+            self._trim()
+            if until is not None:
+                record.update(status="deferred", startAt=until)
+                self._deferred[job_id] = spec
+                self._wakeup.notify_all()
+                return dict(record)
+        self._job_queue.put(spec)
+        return dict(record)
+
+    def resubmit(self, job_id, **changes):
+        # Queue a copy of an earlier job, e.g. with resume=True after it died part-way
+        with self._lock:
+            spec = self._specs.get(job_id)
+        if spec is None:
+            return None
+        return self.submit(dict(spec, **changes))
+
+    def get(self, job_id):
+        with self._lock:
+            record = self._jobs.get(job_id)
+            return dict(record) if record else None
+
+    def list(self):
+        with self._lock:
+            return [dict(self._jobs[job_id]) for job_id in reversed(self._order)]
+
+    def latest(self):
+        with self._lock:
+            return self._order[-1] if self._order else None
+
+    def abort(self, job_id):
+        with self._lock:
+            record = self._jobs.get(job_id)
+            if record is None or record["status"] in TERMINAL_STATUSES:
+                return record is not None
+            if record["status"] == "deferred":
+                self._deferred.pop(job_id, None)
+                self._finish(record, {"status": "aborted", "message": "Operation aborted", "rows": 0})
+                return True
+            if record["status"] == "queued":
+                # Never started; the worker that picks it up is told when it reports the start
+                self._finish(record, {"status": "aborted", "message": "Operation aborted", "rows": 0})
+                return True
+            worker_id = record["worker"]
+        self._workers[worker_id][1].put(("abort", job_id))
+        return True
+
+    def log_channel(self, job_id):
+        return self.logs.get(job_id)
+
+    def _publish(self, job_id, message):
+        self.logs.publish(job_id, message)
+        if self.store is not None:
+            self._outbox.append((job_id, message))
+
+    def _consume_events(self):
+        while True:
+            try:
+                kind, job_id, payload = self._event_queue.get()
+            except (EOFError, OSError):
+                break
+            if kind == "metrics":
+                self.metrics.merge(payload)
+                continue
+            with self._lock:
+                record = self._jobs.get(job_id)
+                if record is None:
+                    continue
+                if kind == "log":
+                    self._publish(job_id, payload)
+                elif kind == "progress":
+                    record["rows"] = payload
+                elif kind == "update":
+                    record.update(payload)
+                elif kind == "started" and record["status"] == "queued":
+                    record.update(status="running", started=time.time(), worker=payload)
+                elif kind == "started" and record["status"] == "aborted":
+                    # Aborted while it sat in the queue
+                    self._workers[payload][1].put(("abort", job_id))
+                elif kind == "finished" and record["status"] not in TERMINAL_STATUSES:
+                    self._finish(record, payload)
+
+    def metrics_text(self):
+        with self._lock:
+            statuses = [record["status"] for record in self._jobs.values()]
+        for status in ("deferred", "queued", "running") + TERMINAL_STATUSES:
+            self.metrics.set("scraper_jobs", statuses.count(status), status=status)
+        self.metrics.set("scraper_job_queue_depth", statuses.count("queued") + statuses.count("deferred"))
+        return self.metrics.render()
+
+    def _sync_store(self):
+        written = {}  # job_id -> record as last written to the store
+        metrics_at = 0
+        while True:
+            time.sleep(STORE_SYNC_SECONDS)
+            with self._lock:
+                records = [dict(record) for record in self._jobs.values()]
+                lines, self._outbox = self._outbox, []
+            try:
+                changed = [record for record in records if written.get(record["id"]) != json.dumps(record, sort_keys=True)]
+                self.store.sync(changed, lines)
+            except Exception as e:
+                # e.g. the database stayed locked past its timeout; keep the lines for the next round
+                with self._lock:
+                    self._outbox[:0] = lines
+                print(f"[WARNING] Job store sync failed: {str(e)}")
+                continue
+            written = {record["id"]: json.dumps(record, sort_keys=True) for record in records}
+            try:
+                if not self._draining:
+                    for record, spec in self.store.take_submissions():
+                        self._accept(record, spec)
+                for job_id in self.store.take_aborts():
+                    self.abort(job_id)
+                if time.monotonic() - metrics_at >= METRICS_FLUSH_SECONDS:
+                    metrics_at = time.monotonic()
+                    self.store.set_meta("metrics", self.metrics_text())
+            except Exception as e:
+                print(f"[WARNING] Job store sync failed: {str(e)}")
+
+    def _release_deferred(self):
+        # Hand deferred jobs to the workers once the maintenance window is over
+        with self._lock:
+            while True:
+                now = time.time()
+                due = [job_id for job_id in self._deferred if self._jobs[job_id]["startAt"] <= now]
+                for job_id in due:
+                    record = self._jobs[job_id]
+                    until = self.calendar.maintenance_until(now)
+                    if until is not None:
+                        # Calendar has another window right after this one
+                        record["startAt"] = until
+                        continue
+                    record.update(status="queued", startAt=None)
+                    self._job_queue.put(self._deferred.pop(job_id))
+                    self._publish(job_id, "Maintenance window over; job queued")
+                wake_at = min((self._jobs[job_id]["startAt"] for job_id in self._deferred), default=None)
+                self._wakeup.wait(None if wake_at is None else max(0.0, wake_at - time.time()))
+
+    def _finish(self, record, result):
+        record.update(status=result["status"], message=result["message"], rows=result.get("rows", 0), finished=time.time())
+        if result.get("proxies") is not None:
+            record["proxies"] = result["proxies"]
+        self.logs.close(record["id"])
+
+    def _trim(self):
+        # Forget the oldest finished jobs once the history limit is reached
+        while len(self._order) > self.history:
+            oldest = self._order[0]
+            if self._jobs[oldest]["status"] not in TERMINAL_STATUSES:
+                break
+            self._order.popleft()
+            self._jobs.pop(oldest, None)
+            self._specs.pop(oldest, None)
+            self.logs.drop(oldest)
+            self.metrics.forget(job=oldest)
@@ -0,0 +1,79 @@
+import os
+from fnmatch import fnmatch
+
+# "lean" runs Chrome headless and keeps heavy resources the printed PDF does
+# not need from loading; "full" is the original headed browser.
+BROWSER_PROFILE = os.environ.get("BROWSER_PROFILE", "full")
+# Categories from BLOCK_CATEGORIES to block. Stylesheets are never blocked:
+# the print layout depends on them. Fonts are opt-in since Urdu and Devanagari
+# records may need web fonts to render.
+LEAN_BLOCK = [c.strip() for c in os.environ.get("LEAN_BLOCK", "analytics,media").split(",") if c.strip()]
+LEAN_BLOCKED_URLS = [p.strip() for p in os.environ.get("LEAN_BLOCKED_URLS", "").split("|") if p.strip()]
+# URL patterns or hosts the PDF needs; these win over anything blocked above
+LEAN_ALLOW = [p.strip() for p in os.environ.get("LEAN_ALLOW", "").split("|") if p.strip()]
+
+BLOCK_CATEGORIES = {
+    "image": ["*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.bmp", "*.ico"],
+    "font": ["*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot"],
+    "media": ["*.mp4", "*.webm", "*.ogg", "*.mp3", "*.wav", "*.m3u8"],
+    "analytics": [
+        "*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*", "*googlesyndication.com*",
+        "*facebook.net*", "*hotjar.com*", "*clarity.ms*", "*addthis.com*", "*sharethis.com*",
+    ],
+}
+ANALYTICS_HOSTS = [
+    "google-analytics.com", "googletagmanager.com", "doubleclick.net", "googlesyndication.com",
+    "facebook.net", "hotjar.com", "clarity.ms", "addthis.com", "sharethis.com",
+]
+
+
+def lean_enabled(profile=None):
+    return (profile or BROWSER_PROFILE) == "lean"
+
+
+def blocked_url_patterns(block=None, extra=None, allow=None):
+    # Network.setBlockedURLs has no allow rules, so allowlisted patterns are
+    # taken out of the block list instead
+    block = LEAN_BLOCK if block is None else block
+    allow = LEAN_ALLOW if allow is None else allow
+    patterns = []
+    for category in block:
+        patterns.extend(BLOCK_CATEGORIES.get(category, []))
+    patterns.extend(LEAN_BLOCKED_URLS if extra is None else extra)
+    return [p for p in patterns if not any(p == a or fnmatch(p, a) for a in allow)]
+
+
+def apply_lean_options(options, block=None, allow=None):
+    # Browser-wide settings. These also cover the record windows, which open
+    # and start loading before a per-window CDP call could reach them.
+    block = LEAN_BLOCK if block is None else block
+    allow = LEAN_ALLOW if allow is None else allow
+    options.add_argument("--headless=new")
+    options.add_argument("--disable-extensions")
+    options.add_argument("--disable-background-networking")
+    options.add_argument("--disable-component-update")
+    options.add_argument("--disable-sync")
+    options.add_argument("--mute-audio")
+    options.add_argument("--no-first-run")
+    if "analytics" in block:
+        # Fail DNS for trackers outright, except hosts on the allowlist
+        rules = [f"MAP {pattern} ~NOTFOUND" for host in ANALYTICS_HOSTS for pattern in (host, "*." + host)]
+        rules += [f"EXCLUDE {host}" for host in allow if "/" not in host]
+        options.add_argument("--host-resolver-rules=" + ", ".join(rules))
+    prefs = {}
+    if "image" in block:
+        # Content settings take per-site exceptions, which is how allowlisted hosts keep their images
+        prefs["profile.default_content_setting_values.images"] = 2
+        prefs["profile.content_settings.exceptions.images"] = {
+            f"[*.]{host.lstrip('*.')},*": {"setting": 1} for host in allow if "/" not in host
+        }
+    return prefs
+
+
+def block_requests(driver, patterns=None):
+    # Per-window URL blocking; Chrome keeps it for later navigations in the same window
+    patterns = blocked_url_patterns() if patterns is None else patterns
+    if not patterns:
+        return
+    driver.execute_cdp_cmd("Network.enable", {})
+    driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": patterns})
@@ -0,0 +1,353 @@
+import argparse, http.client, json, os, queue, random, signal, subprocess, sys, tempfile, threading, time
+
+# Load test for the web endpoints, offline: the app runs in a child process with
+# the scrape workers replaced by a stub that logs, reports progress and writes
+# small PDFs at a steady pace without a browser. Concurrent clients then
+# subscribe to /stream, submit jobs, poll their status and download ZIPs, e.g.
+#   python loadtest.py --duration 60 --streams 50 --submitters 2 --pollers 10 --zippers 2
+# Prints one JSON report: latency percentiles per endpoint, SSE lines lost,
+# and the server process's thread, file descriptor and memory use over the run.
+# The stub's pace comes from LOADTEST_LOG_LINES, LOADTEST_LINE_DELAY,
+# LOADTEST_ROWS and LOADTEST_PDF_KB.
+
+STUB_LOG_LINES = int(os.environ.get("LOADTEST_LOG_LINES", 200))
+STUB_LINE_DELAY = float(os.environ.get("LOADTEST_LINE_DELAY", 0.01))
+STUB_ROWS = int(os.environ.get("LOADTEST_ROWS", 20))
+STUB_PDF_KB = int(os.environ.get("LOADTEST_PDF_KB", 50))
+SOCKET_TIMEOUT = 60
+
+
+def stub_worker_main(worker_id, job_queue, control_queue, event_queue):
+    # Speaks the same event protocol as jobs.worker_main
+    aborted = set()
+
+    def listen():
+        while True:
+            command, job_id = control_queue.get()
+            if command == "stop":
+                break
+            if command == "abort":
+                aborted.add(job_id)
+
+    threading.Thread(target=listen, name="job-control", daemon=True).start()
+    payload = b"%PDF-1.4\n" + os.urandom(STUB_PDF_KB * 1024)
+    while True:
+        spec = job_queue.get()
+        if spec is None:
+            break
+        job_id = spec["id"]
+        event_queue.put(("started", job_id, worker_id))
+        rows = 0
+        for line in range(1, STUB_LOG_LINES + 1):
+            if job_id in aborted:
+                break
+            # Numbered so subscribers can tell which lines they missed
+            event_queue.put(("log", job_id, f"Processing line {line}/{STUB_LOG_LINES}"))
+            if rows < STUB_ROWS and line * STUB_ROWS >= (rows + 1) * STUB_LOG_LINES:
+                rows += 1
+                with open(os.path.join(spec["save_dir"], f"row_{rows:05d}.pdf"), "wb") as f:
+                    f.write(payload)
+                event_queue.put(("progress", job_id, rows))
+            time.sleep(STUB_LINE_DELAY)
+        if job_id in aborted:
+            result = {"status": "aborted", "message": "Operation aborted", "rows": rows}
+        else:
+            result = {"status": "completed", "message": f"Scraping completed. PDFs saved in 'pdf_output/{spec['folder_name']}' folder.", "rows": rows}
+        event_queue.put(("finished", job_id, result))
+        aborted.discard(job_id)
+
+
+def serve(port, processes):
+    # Child process: the real app and supervisor, with the stub behind them
+    from werkzeug.serving import make_server
+    import app as web
+    from jobs import JobSupervisor
+
+    web.supervisor = JobSupervisor(processes=processes, log_capacity=web.supervisor.logs.capacity,
+                                   calendar=web.supervisor.calendar, worker=stub_worker_main)
+    web.supervisor.start()
+    # Same server app.run uses, without the debugger and reloader
+    server = make_server("127.0.0.1", port, web.app, threaded=True)
+    # terminate() from the load generator: stop serving and let the workers exit cleanly
+    signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(target=server.shutdown).start())
+    print(f"serving on {server.server_port}", flush=True)
+    try:
+        server.serve_forever()
+    finally:
+        web.supervisor.shutdown()
+
+
+def process_stats(pid):
+    stats = {"threads": 0, "fds": 0, "rss_bytes": 0}
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("Threads:"):
+                    stats["threads"] = int(line.split()[1])
+                elif line.startswith("VmRSS:"):
+                    stats["rss_bytes"] = int(line.split()[1]) * 1024
+        stats["fds"] = len(os.listdir(f"/proc/{pid}/fd"))
+    except OSError:
+        pass
+    return stats
+
+
+def percentiles(values):
+    if not values:
+        return {"p50": None, "p95": None, "p99": None, "max": None}
+    ordered = sorted(values)
+    pick = lambda fraction: round(ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))], 4)
+    return {"p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99), "max": round(ordered[-1], 4)}
+
+
+class LoadTest:
+    def __init__(self, port, args):
+        self.port = port
+        self.args = args
+        self.stop = threading.Event()
+        self.lock = threading.Lock()
+        self.latencies = {}  # endpoint -> [seconds]
+        self.errors = {}     # endpoint -> count
+        self.jobs = []       # (job id, folder name), newest last
+        self.finished = queue.Queue()  # folders whose job has ended, for the ZIP clients
+        self.sse = {"streams": 0, "completed": 0, "lines": 0, "lost": 0, "reported_dropped": 0}
+
+    def record(self, endpoint, seconds=None, error=False):
+        with self.lock:
+            if error:
+                self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+            else:
+                self.latencies.setdefault(endpoint, []).append(seconds)
+
+    def request(self, endpoint, method, path, body=None):
+        started = time.monotonic()
+        connection = http.client.HTTPConnection("127.0.0.1", self.port, timeout=SOCKET_TIMEOUT)
+        try:
+            headers = {"Content-Type": "application/json"} if body is not None else {}
+            connection.request(method, path, json.dumps(body) if body is not None else None, headers)
+            response = connection.getresponse()
+            data = response.read()
+        except (OSError, http.client.HTTPException):
+            self.record(endpoint, error=True)
+            return None, None
+        finally:
+            connection.close()
+        self.record(endpoint, time.monotonic() - started, error=response.status >= 500)
+        return response.status, data
+
+    def pause(self):
+        self.stop.wait(self.args.think_ms / 1000.0)
+
+    def latest_job(self):
+        with self.lock:
+            return self.jobs[-1][0] if self.jobs else None
+
+    def submitter(self, client):
+        count = 0
+        while not self.stop.is_set():
+            count += 1
+            folder = f"load-{client}-{count}-{int(time.time() * 1000)}"
+            status, data = self.request("POST /scrape", "POST", "/scrape", {
+                "loginUrl": "http://stub.invalid/login",
+                "urls": ["http://stub.invalid/table"],
+                "folderName": folder,
+            })
+            if status == 202:
+                job_id = json.loads(data)["jobId"]
+                with self.lock:
+                    self.jobs.append((job_id, folder))
+                threading.Thread(target=self.watch, args=(job_id, folder), daemon=True).start()
+            self.stop.wait(self.args.submit_interval)
+
+    def watch(self, job_id, folder):
+        # Hands the folder to the ZIP clients once its job has ended
+        while not self.stop.is_set():
+            status, data = self.request("GET /jobs/<id>", "GET", f"/jobs/{job_id}")
+            if status == 200 and json.loads(data)["status"] in ("completed", "failed", "aborted"):
+                self.finished.put(folder)
+                return
+            self.stop.wait(1)
+
+    def poller(self, client):
+        while not self.stop.is_set():
+            with self.lock:
+                job = random.choice(self.jobs)[0] if self.jobs else None
+            if job is None:
+                self.request("GET /jobs", "GET", "/jobs")
+            else:
+                self.request("GET /jobs/<id>", "GET", f"/jobs/{job}")
+            self.pause()
+
+    def streamer(self, client):
+        while not self.stop.is_set():
+            job_id = self.latest_job()
+            if job_id is None:
+                self.pause()
+                continue
+            self.stream(job_id)
+            self.pause()
+
+    def stream(self, job_id):
+        started = time.monotonic()
+        connection = http.client.HTTPConnection("127.0.0.1", self.port, timeout=SOCKET_TIMEOUT)
+        seen, reported, ended, first = set(), 0, False, None
+        try:
+            connection.request("GET", f"/stream?job={job_id}")
+            response = connection.getresponse()
+            if response.status != 200:
+                self.record("GET /stream", error=True)
+                return
+            event = None
+            while not self.stop.is_set():
+                line = response.fp.readline()
+                if not line:
+                    break
+                line = line.decode("utf-8").rstrip("\n")
+                if first is None and line.startswith("data:"):
+                    first = time.monotonic() - started
+                if line.startswith("event: "):
+                    event = line[7:]
+                elif line.startswith("data: "):
+                    data = line[6:]
+                    if event == "end":
+                        ended = True
+                    elif data.startswith("Processing line "):
+                        seen.add(int(data.split()[2].split("/")[0]))
+                    elif "earlier log lines are no longer available" in data:
+                        reported += int(data.split()[1])
+                elif line == "":
+                    event = None
+                if ended:
+                    break
+        except (OSError, http.client.HTTPException, ValueError):
+            self.record("GET /stream", error=True)
+            return
+        finally:
+            connection.close()
+        if first is not None:
+            self.record("GET /stream (first event)", first)
+        with self.lock:
+            self.sse["streams"] += 1
+            self.sse["lines"] += len(seen)
+            if ended:
+                # Only a stream that ran to the end can be checked for gaps
+                self.sse["completed"] += 1
+                self.sse["lost"] += STUB_LOG_LINES - len(seen) if seen else 0
+                self.sse["reported_dropped"] += reported
+
+    def zipper(self, client):
+        while not self.stop.is_set():
+            try:
+                folder = self.finished.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            status, data = self.request("POST /create-zip", "POST", "/create-zip", {"folderName": folder})
+            if status == 200:
+                status, data = self.request("GET /download-zip", "GET", json.loads(data)["downloadUrl"])
+                if status == 200 and not data.startswith(b"PK"):
+                    self.record("GET /download-zip", error=True)
+            self.pause()
+
+    def run(self, server_pid):
+        roles = [("submitter", self.args.submitters), ("poller", self.args.pollers),
+                 ("streamer", self.args.streams), ("zipper", self.args.zippers)]
+        threads = [
+            threading.Thread(target=getattr(self, role), args=(client,), name=f"{role}-{client}", daemon=True)
+            for role, count in roles for client in range(count)
+        ]
+        samples = [process_stats(server_pid)]
+        started = time.monotonic()
+        for thread in threads:
+            thread.start()
+        while time.monotonic() - started < self.args.duration:
+            time.sleep(0.5)
+            samples.append(process_stats(server_pid))
+        self.stop.set()
+        for thread in threads:
+            thread.join(timeout=SOCKET_TIMEOUT)
+        time.sleep(1)  # let the server close the finished connections
+        samples.append(process_stats(server_pid))
+        elapsed = time.monotonic() - started
+
+        with self.lock:
+            endpoints = {
+                endpoint: dict(requests=len(self.latencies.get(endpoint, [])), errors=self.errors.get(endpoint, 0),
+                               **percentiles(self.latencies.get(endpoint, [])))
+                for endpoint in sorted(set(self.latencies) | set(self.errors))
+            }
+            jobs = len(self.jobs)
+            sse = dict(self.sse)
+        server = {}
+        for key in ("threads", "fds", "rss_bytes"):
+            server[key] = {"start": samples[0][key], "peak": max(s[key] for s in samples), "end": samples[-1][key]}
+        server["rss_growth_bytes"] = samples[-1]["rss_bytes"] - samples[0]["rss_bytes"]
+        return {
+            "seconds": round(elapsed, 3),
+            "jobs_submitted": jobs,
+            "endpoints": endpoints,
+            "sse": sse,
+            "server": server,
+            "config": {
+                "streams": self.args.streams, "submitters": self.args.submitters, "pollers": self.args.pollers,
+                "zippers": self.args.zippers, "submit_interval": self.args.submit_interval, "think_ms": self.args.think_ms,
+                "processes": self.args.processes, "log_lines": STUB_LOG_LINES, "line_delay": STUB_LINE_DELAY,
+                "rows": STUB_ROWS, "pdf_kb": STUB_PDF_KB,
+            },
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the web endpoints against a stubbed scrape backend")
+    parser.add_argument("--duration", type=float, default=30, help="seconds of load")
+    parser.add_argument("--streams", type=int, default=20, help="concurrent /stream subscribers")
+    parser.add_argument("--submitters", type=int, default=1, help="clients submitting jobs")
+    parser.add_argument("--submit-interval", type=float, default=2, help="seconds between one client's submissions")
+    parser.add_argument("--pollers", type=int, default=5, help="clients polling job status")
+    parser.add_argument("--zippers", type=int, default=1, help="clients downloading finished folders as ZIP")
+    parser.add_argument("--think-ms", type=int, default=100, help="pause between one client's requests")
+    parser.add_argument("--processes", type=int, default=2, help="stub worker processes")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    parser.add_argument("--serve", type=int, metavar="PORT", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.serve is not None:
+        serve(args.serve, args.processes)
+        return 0
+
+    # Run the server from a scratch directory so pdf_output and run_state stay out of the checkout
+    work_dir = tempfile.mkdtemp(prefix="scrape-load-")
+    env = dict(os.environ, MAINTENANCE_WINDOWS=os.environ.get("MAINTENANCE_WINDOWS", ""),
+               PYTHONPATH=os.pathsep.join(filter(None, [os.path.dirname(os.path.abspath(__file__)), os.environ.get("PYTHONPATH")])))
+    server = subprocess.Popen(
+        [sys.executable, "-u", os.path.abspath(__file__), "--serve", "0", "--processes", str(args.processes)],
+        cwd=work_dir, env=env, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+    )
+    try:
+        port = None
+        for line in server.stdout:
+            if line.startswith("serving on "):
+                port = int(line.split()[-1])
+                break
+        if port is None:
+            print("Server failed to start", file=sys.stderr)
+            return 1
+        # Keep draining the server's own log so it never blocks on a full pipe
+        threading.Thread(target=lambda: [None for _ in server.stdout], daemon=True).start()
+        result = LoadTest(port, args).run(server.pid)
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+    text = json.dumps(result, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
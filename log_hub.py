@@ -0,0 +1,73 @@
+import threading
+from collections import deque
+
+
+class LogChannel:
+    # Bounded replay buffer for one job. Every line gets a sequence number so
+    # subscribers can resume from Last-Event-ID; readers block on a condition
+    # instead of polling.
+    def __init__(self, capacity):
+        self._buffer = deque(maxlen=capacity)
+        self._cond = threading.Condition()
+        self._last_id = 0
+        self.closed = False
+
+    def publish(self, message):
+        with self._cond:
+            self._last_id += 1
+            self._buffer.append((self._last_id, message))
+            self._cond.notify_all()
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+    def read(self, after_id, timeout=None, limit=None):
+        # Returns (entries newer than after_id, number of lines lost to the ring buffer, closed)
+        with self._cond:
+            self._cond.wait_for(lambda: self._last_id > after_id or self.closed, timeout)
+            if not self._buffer or self._last_id <= after_id:
+                return [], 0, self.closed
+            first_id = self._buffer[0][0]
+            dropped = max(0, first_id - after_id - 1)
+            start = max(0, after_id + 1 - first_id)
+            entries = [self._buffer[i] for i in range(start, len(self._buffer))]
+            if limit:
+                entries = entries[:limit]
+            return entries, dropped, self.closed and entries[-1][0] == self._last_id
+
+
+class LogHub:
+    # Fan-out of job log lines to any number of /stream subscribers
+    def __init__(self, capacity=2000):
+        self.capacity = capacity
+        self._lock = threading.Lock()
+        self._channels = {}
+
+    def open(self, job_id):
+        with self._lock:
+            channel = self._channels.get(job_id)
+            if channel is None:
+                channel = self._channels[job_id] = LogChannel(self.capacity)
+            return channel
+
+    def get(self, job_id):
+        with self._lock:
+            return self._channels.get(job_id)
+
+    def publish(self, job_id, message):
+        channel = self.get(job_id)
+        if channel is not None:
+            channel.publish(message)
+
+    def close(self, job_id):
+        channel = self.get(job_id)
+        if channel is not None:
+            channel.close()
+
+    def drop(self, job_id):
+        with self._lock:
+            channel = self._channels.pop(job_id, None)
+        if channel is not None:
+            channel.close()
@@ -0,0 +1,78 @@
+import os, re
+from datetime import datetime, time as dtime, timedelta
+import pytz
+
+# Maintenance calendar, ';'-separated. Each entry is a time range in
+# MAINTENANCE_TZ, optionally limited to a weekday or a single date; ranges may
+# cross midnight:
+#   22:58-00:31                  every day
+#   Sun 02:00-06:00              every Sunday
+#   2026-11-01 09:00-13:00       once
+MAINTENANCE_WINDOWS = os.environ.get("MAINTENANCE_WINDOWS", "22:58-00:31")
+MAINTENANCE_TZ = os.environ.get("MAINTENANCE_TZ", "Asia/Kolkata")
+WEEKDAYS = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
+RULE_PATTERN = re.compile(r"^(?:(?P<day>[A-Za-z]{3})|(?P<date>\d{4}-\d{2}-\d{2}))?\s*(?P<start>\d{1,2}:\d{2})\s*-\s*(?P<end>\d{1,2}:\d{2})$")
+
+
+def _clock(value):
+    hour, minute = value.split(":")
+    return dtime(int(hour), int(minute))
+
+
+class MaintenanceCalendar:
+    # Answers two questions for the scheduler: is the site in maintenance at a
+    # given moment (and until when), and when does the next window start.
+    # Times in and out are epoch seconds.
+    def __init__(self, rules, tz):
+        self.rules = rules  # [(weekday or None, date or None, start time, end time)]
+        self.tz = tz
+
+    @classmethod
+    def parse(cls, spec, tz_name=MAINTENANCE_TZ):
+        rules = []
+        for entry in spec.split(";"):
+            entry = entry.strip()
+            if not entry:
+                continue
+            match = RULE_PATTERN.match(entry)
+            if match is None or (match.group("day") and match.group("day").lower() not in WEEKDAYS):
+                raise ValueError(f"Invalid maintenance window: {entry!r}")
+            weekday = WEEKDAYS.index(match.group("day").lower()) if match.group("day") else None
+            date = datetime.strptime(match.group("date"), "%Y-%m-%d").date() if match.group("date") else None
+            rules.append((weekday, date, _clock(match.group("start")), _clock(match.group("end"))))
+        return cls(rules, pytz.timezone(tz_name))
+
+    def _windows(self, ts, days_before=1, days_after=8):
+        today = datetime.fromtimestamp(ts, self.tz).date()
+        windows = []
+        for offset in range(-days_before, days_after):
+            day = today + timedelta(days=offset)
+            for weekday, date, start, end in self.rules:
+                if (weekday is not None and day.weekday() != weekday) or (date is not None and day != date):
+                    continue
+                start_at = self.tz.localize(datetime.combine(day, start))
+                end_day = day if end > start else day + timedelta(days=1)
+                end_at = self.tz.localize(datetime.combine(end_day, end))
+                windows.append((start_at.timestamp(), end_at.timestamp()))
+        return sorted(windows)
+
+    def maintenance_until(self, ts):
+        # End of the maintenance that covers ts (back-to-back windows chained), or None
+        until = None
+        for start, end in self._windows(ts):
+            if start <= (until or ts) < end:
+                until = end
+        return until
+
+    def next_maintenance(self, ts):
+        # Start of the first window after ts, or None if there is none within a week
+        for start, end in self._windows(ts):
+            if start > ts:
+                return start
+        return None
+
+    def describe(self, ts):
+        return datetime.fromtimestamp(ts, self.tz).strftime("%I:%M %p %Z").lstrip("0")
+
+
+maintenance_calendar = MaintenanceCalendar.parse(MAINTENANCE_WINDOWS)
@@ -0,0 +1,63 @@
+import hashlib, json, os, threading
+
+MANIFEST_DIR = os.environ.get("MANIFEST_DIR", os.path.join(os.path.abspath("run_state"), "manifests"))
+
+
+def row_fingerprint(row):
+    # row is the metadata list from the table page: [id, waqf_id, property_id, district, *extra columns]
+    return hashlib.sha1(json.dumps(row, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class RowManifest:
+    # Per-folder record of the fingerprint and file of every row printed so
+    # far, keyed by table URL and row id. Incremental runs diff the live table
+    # against it and only print rows that are new or whose cells changed.
+    def __init__(self, path, save_every=50):
+        self.path = path
+        self.save_every = save_every
+        self.tables = {}
+        self._lock = threading.Lock()
+        self._unsaved = 0
+
+    @classmethod
+    def for_folder(cls, folder_name):
+        return cls(os.path.join(MANIFEST_DIR, f"{folder_name}.json"))
+
+    def load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                self.tables = json.load(f).get("tables", {})
+        except (OSError, ValueError):
+            self.tables = {}
+        return self
+
+    def changed(self, table_url, row, save_dir):
+        entry = self.tables.get(table_url, {}).get(row[0])
+        if entry is None or entry["fp"] != row_fingerprint(row):
+            return True
+        return not os.path.exists(os.path.join(save_dir, entry["file"]))
+
+    def filename(self, table_url, row_id):
+        # File the row was saved to last time, if any
+        entry = self.tables.get(table_url, {}).get(row_id)
+        return entry["file"] if entry is not None else None
+
+    def update(self, table_url, row, filename):
+        with self._lock:
+            self.tables.setdefault(table_url, {})[row[0]] = {"fp": row_fingerprint(row), "file": filename}
+            self._unsaved += 1
+            if self._unsaved >= self.save_every:
+                self._save()
+
+    def save(self):
+        with self._lock:
+            if self._unsaved:
+                self._save()
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"tables": self.tables}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+        self._unsaved = 0
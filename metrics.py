@@ -0,0 +1,122 @@
+import threading
+from bisect import bisect_left
+
+STAGE_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+METRICS = {
+    # name: (type, help)
+    "scraper_stage_seconds": ("histogram", "Time spent in each stage of the row pipeline"),
+    "scraper_rows_total": ("counter", "Rows handled, by outcome"),
+    "scraper_bytes_written_total": ("counter", "PDF bytes written to disk"),
+    "scraper_browser_pool_browsers": ("gauge", "Browsers in each worker process's pool, by state"),
+    "scraper_jobs": ("gauge", "Jobs known to the supervisor, by status"),
+    "scraper_job_queue_depth": ("gauge", "Jobs waiting for a worker process, including deferred ones"),
+    "scraper_concurrency_limit": ("gauge", "Rows a job's adaptive limit lets run at once"),
+    "scraper_rate_limit": ("gauge", "Rows per second a job's adaptive limit lets start, once the site has pushed back"),
+    "scraper_row_retries_total": ("counter", "Rows retried after the site throttled or timed out, by reason"),
+}
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+class MetricsRegistry:
+    # In-process counters, gauges and histograms. Worker processes record into
+    # their own registry and ship drained deltas to the web process, which
+    # merges them and renders the Prometheus text format for /metrics.
+    def __init__(self, buckets=STAGE_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}  # key -> [count per bucket..., +Inf count, sum]
+
+    def inc(self, name, value=1, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        with self._lock:
+            self._gauges[_key(name, labels)] = value
+
+    def observe(self, name, value, **labels):
+        key = _key(name, labels)
+        slot = bisect_left(self.buckets, value)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [0] * (len(self.buckets) + 2)
+            histogram[slot] += 1
+            histogram[-1] += value
+
+    def drain(self):
+        # Everything recorded since the last drain, as a picklable snapshot
+        with self._lock:
+            snapshot = {"counters": self._counters, "histograms": self._histograms, "gauges": dict(self._gauges)}
+            self._counters = {}
+            self._histograms = {}
+        return snapshot
+
+    def merge(self, snapshot):
+        with self._lock:
+            for key, value in snapshot["counters"].items():
+                self._counters[key] = self._counters.get(key, 0) + value
+            for key, values in snapshot["histograms"].items():
+                histogram = self._histograms.get(key)
+                if histogram is None:
+                    self._histograms[key] = list(values)
+                else:
+                    for i, value in enumerate(values):
+                        histogram[i] += value
+            self._gauges.update(snapshot["gauges"])
+
+    def forget(self, **labels):
+        # Drop every series carrying these labels, e.g. a job that left the history
+        wanted = set(labels.items())
+        with self._lock:
+            for series in (self._counters, self._gauges, self._histograms):
+                for key in [key for key in series if wanted <= set(key[1])]:
+                    del series[key]
+
+    def render(self):
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            histograms = {key: list(values) for key, values in self._histograms.items()}
+        by_name = {}
+        for series in (counters, gauges, histograms):
+            for key in series:
+                by_name.setdefault(key[0], []).append(key)
+        lines = []
+        for name in sorted(by_name):
+            kind, help_text = METRICS.get(name, ("untyped", ""))
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for key in sorted(by_name[name]):
+                labels = key[1]
+                if key in histograms:
+                    values = histograms[key]
+                    cumulative = 0
+                    for bound, count in zip(list(self.buckets) + ["+Inf"], values[:-1]):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {values[-1]}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {cumulative}")
+                else:
+                    lines.append(f"{name}{_format_labels(labels)} {counters.get(key, gauges.get(key))}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
@@ -0,0 +1,247 @@
+import base64, os, select, socket, threading, time
+from urllib.parse import urlsplit, unquote
+
+PROXY_FILE = os.environ.get("PROXY_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "proxies.txt"))
+
+
+class Proxy:
+    def __init__(self, url, scheme, host, port, username=None, password=None):
+        self.url = url
+        self.scheme = scheme
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.in_use = 0
+        self.latency = None          # EWMA of per-row seconds through this proxy
+        self.successes = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.quarantined_until = 0
+        self.quarantine_count = 0
+        self._forwarder = None
+
+    @property
+    def label(self):
+        # Never put credentials in logs or status output
+        return f"{self.host}:{self.port}"
+
+    def error_rate(self):
+        total = self.successes + self.failures
+        return self.failures / total if total else 0.0
+
+    def score(self):
+        # Lower is better: unmeasured proxies get tried before slow or flaky ones
+        return (self.latency or 0.0) * (1 + 4 * self.error_rate()) + self.in_use
+
+    def server_arg(self):
+        # Chrome cannot take credentials in --proxy-server, so authenticated
+        # proxies go through a local forwarder that adds Proxy-Authorization
+        if self.username is None:
+            return f"{self.scheme}://{self.host}:{self.port}"
+        if self._forwarder is None:
+            self._forwarder = AuthForwarder(self)
+        return f"http://127.0.0.1:{self._forwarder.port}"
+
+    def stats(self):
+        return {
+            "proxy": self.label,
+            "inUse": self.in_use,
+            "latency": round(self.latency, 3) if self.latency is not None else None,
+            "errorRate": round(self.error_rate(), 3),
+            "quarantined": self.quarantined_until > time.monotonic(),
+        }
+
+
+def parse_proxy(line):
+    parts = urlsplit(line if "://" in line else "http://" + line)
+    try:
+        port = parts.port
+    except ValueError:
+        return None
+    if not parts.hostname or not port or parts.scheme not in ("http", "https", "socks4", "socks5"):
+        return None
+    username = unquote(parts.username) if parts.username else None
+    password = unquote(parts.password) if parts.password else None
+    if username is not None and parts.scheme != "http":
+        # The forwarder only speaks HTTP proxy auth, over plain TCP
+        return None
+    return Proxy(line, parts.scheme, parts.hostname, port, username, password)
+
+
+class ProxyPool:
+    # Hands out egress proxies to browser launches and keeps per-proxy health:
+    # an EWMA of row latency and the error rate. Proxies that keep failing are
+    # quarantined with exponential backoff.
+    def __init__(self, proxies=(), failure_limit=3, max_error_rate=0.5, quarantine_seconds=60, log=None):
+        self.proxies = list(proxies)
+        self.failure_limit = failure_limit
+        self.max_error_rate = max_error_rate
+        self.quarantine_seconds = quarantine_seconds
+        self.log = log or (lambda message, level='INFO': print(message))
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_file(cls, path=PROXY_FILE, **kwargs):
+        proxies = []
+        skipped = 0
+        try:
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line or line.startswith("#"):
+                        continue
+                    proxy = parse_proxy(line)
+                    if proxy is None:
+                        skipped += 1
+                    else:
+                        proxies.append(proxy)
+        except FileNotFoundError:
+            pass
+        pool = cls(proxies, **kwargs)
+        if skipped:
+            pool.log(f"Ignored {skipped} unusable line(s) in {path}", level='WARNING')
+        return pool
+
+    def __len__(self):
+        return len(self.proxies)
+
+    def acquire(self):
+        if not self.proxies:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            available = [p for p in self.proxies if p.quarantined_until <= now]
+            if not available:
+                # Everything is quarantined; the one that comes back first is the best bet
+                available = [min(self.proxies, key=lambda p: p.quarantined_until)]
+            proxy = min(available, key=Proxy.score)
+            proxy.in_use += 1
+            return proxy
+
+    def release(self, proxy):
+        if proxy is None:
+            return
+        with self._lock:
+            proxy.in_use = max(0, proxy.in_use - 1)
+
+    def record(self, proxy, ok, latency=None):
+        if proxy is None:
+            return
+        with self._lock:
+            if ok:
+                proxy.successes += 1
+                proxy.consecutive_failures = 0
+                if latency is not None:
+                    proxy.latency = latency if proxy.latency is None else 0.8 * proxy.latency + 0.2 * latency
+                return
+            proxy.failures += 1
+            proxy.consecutive_failures += 1
+            too_many = proxy.consecutive_failures >= self.failure_limit
+            too_flaky = proxy.successes + proxy.failures >= 10 and proxy.error_rate() > self.max_error_rate
+            if not (too_many or too_flaky):
+                return
+            backoff = min(self.quarantine_seconds * (2 ** proxy.quarantine_count), 1800)
+            proxy.quarantined_until = time.monotonic() + backoff
+            proxy.quarantine_count += 1
+            # Start with a clean slate after the quarantine so one bad spell is not held against it forever
+            proxy.successes = proxy.failures = proxy.consecutive_failures = 0
+        self.log(f"Proxy {proxy.label} quarantined for {backoff:.0f}s", level='WARNING')
+
+    def usable(self, proxy):
+        return proxy is None or proxy.quarantined_until <= time.monotonic()
+
+    def stats(self):
+        with self._lock:
+            return [p.stats() for p in self.proxies]
+
+
+class AuthForwarder:
+    # Local listener that relays Chrome's proxy traffic to an authenticated
+    # upstream proxy, adding the Proxy-Authorization header to each request head.
+    # Only the first head on a connection is rewritten, so plain-http requests
+    # are sent with Connection: close and Chrome opens a new connection for the
+    # next one; HTTPS is a single CONNECT followed by opaque TLS bytes.
+    def __init__(self, proxy):
+        self.proxy = proxy
+        credentials = f"{proxy.username}:{proxy.password or ''}".encode("utf-8")
+        self.auth_header = b"Proxy-Authorization: Basic " + base64.b64encode(credentials) + b"\r\n"
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind(("127.0.0.1", 0))
+        self.server.listen(64)
+        self.port = self.server.getsockname()[1]
+        threading.Thread(target=self._accept_loop, name=f"proxy-forwarder-{self.port}", daemon=True).start()
+
+    def _accept_loop(self):
+        while True:
+            try:
+                client, _ = self.server.accept()
+            except OSError:
+                break
+            threading.Thread(target=self._handle, args=(client,), daemon=True).start()
+
+    def _handle(self, client):
+        upstream = None
+        try:
+            head = b""
+            while b"\r\n\r\n" not in head:
+                data = client.recv(65536)
+                if not data:
+                    return
+                head += data
+                if len(head) > 65536:
+                    return
+            head, body = head.split(b"\r\n\r\n", 1)
+            request_line, *headers = head.split(b"\r\n")
+            # Credentials go right after the request line; Chrome's own never reach the upstream
+            lines = [request_line, self.auth_header.rstrip(b"\r\n")]
+            for header in headers:
+                name = header.split(b":", 1)[0].strip().lower()
+                if name in (b"proxy-authorization", b"connection", b"proxy-connection", b"keep-alive"):
+                    continue
+                lines.append(header)
+            connect = request_line.upper().startswith(b"CONNECT ")
+            if not connect:
+                lines.append(b"Connection: close")
+            head = b"\r\n".join(lines) + b"\r\n\r\n" + body
+            upstream = socket.create_connection((self.proxy.host, self.proxy.port), timeout=30)
+            upstream.settimeout(None)
+            upstream.sendall(head)
+            self._pipe(client, upstream, close_response=not connect)
+        except OSError:
+            pass
+        finally:
+            client.close()
+            if upstream is not None:
+                upstream.close()
+
+    def _pipe(self, client, upstream, close_response=False):
+        # close_response: tell Chrome the connection ends with this response, so
+        # it never sends a second request (without credentials) down it
+        sockets = [client, upstream]
+        response_head = b"" if close_response else None
+        while True:
+            readable, _, errored = select.select(sockets, [], sockets, 300)
+            if errored or not readable:
+                return
+            for sock in readable:
+                data = sock.recv(65536)
+                if not data:
+                    if response_head:
+                        client.sendall(response_head)
+                    return
+                if sock is client:
+                    upstream.sendall(data)
+                    continue
+                if response_head is not None:
+                    response_head += data
+                    if b"\r\n\r\n" not in response_head:
+                        continue
+                    head, data = response_head.split(b"\r\n\r\n", 1)
+                    status_line, *headers = head.split(b"\r\n")
+                    lines = [status_line] + [h for h in headers if h.split(b":", 1)[0].strip().lower()
+                                             not in (b"connection", b"proxy-connection", b"keep-alive")]
+                    data = b"\r\n".join(lines + [b"Connection: close", b"Proxy-Connection: close"]) + b"\r\n\r\n" + data
+                    response_head = None
+                client.sendall(data)
@@ -0,0 +1,98 @@
+import json, os, time, weakref
+from selenium.webdriver.common.by import By
+from selenium.common.exceptions import WebDriverException
+
+READY_TIMEOUT = float(os.environ.get("READY_TIMEOUT", 15))         # hard cap per wait, seconds
+NETWORK_IDLE_MS = float(os.environ.get("NETWORK_IDLE_MS", 500))    # quiet period that counts as idle
+NETWORK_IDLE_MAX_INFLIGHT = int(os.environ.get("NETWORK_IDLE_MAX_INFLIGHT", 0))
+POLL_INTERVAL = float(os.environ.get("READY_POLL_INTERVAL", 0.1))
+STALE_REQUEST_SECONDS = 30  # long-polls and beacons that never finish stop counting after this
+
+_trackers = weakref.WeakKeyDictionary()
+
+
+class NetworkTracker:
+    # Follows in-flight requests from the Network.* events Chrome writes to the
+    # performance log (enabled through goog:loggingPrefs in get_chrome_options).
+    def __init__(self):
+        self.inflight = {}
+        self.last_activity = time.monotonic()
+        self.enabled = True
+
+    def update(self, driver):
+        try:
+            entries = driver.get_log("performance")
+        except Exception:
+            # Performance logging not enabled for this browser; fall back to DOM signals only
+            self.enabled = False
+            return
+        now = time.monotonic()
+        for entry in entries:
+            try:
+                message = json.loads(entry["message"])["message"]
+            except (KeyError, ValueError):
+                continue
+            method = message.get("method")
+            if method == "Network.requestWillBeSent":
+                self.inflight[message["params"]["requestId"]] = now
+            elif method in ("Network.loadingFinished", "Network.loadingFailed"):
+                self.inflight.pop(message["params"]["requestId"], None)
+            else:
+                continue
+            self.last_activity = now
+        for request_id, started in list(self.inflight.items()):
+            if now - started > STALE_REQUEST_SECONDS:
+                del self.inflight[request_id]
+
+    def idle(self, idle_ms=NETWORK_IDLE_MS, max_inflight=NETWORK_IDLE_MAX_INFLIGHT):
+        quiet = (time.monotonic() - self.last_activity) * 1000 >= idle_ms
+        return len(self.inflight) <= max_inflight and quiet
+
+    def reset(self, driver):
+        # Drain events left over from a closed or previous page before forgetting them
+        if self.enabled:
+            self.update(driver)
+        self.inflight.clear()
+        self.last_activity = time.monotonic()
+
+
+def tracker_for(driver):
+    tracker = _trackers.get(driver)
+    if tracker is None:
+        tracker = _trackers[driver] = NetworkTracker()
+    return tracker
+
+
+def forget_network(driver):
+    tracker_for(driver).reset(driver)
+
+
+def element_present(selector, by=By.CSS_SELECTOR):
+    return lambda driver: len(driver.find_elements(by, selector)) > 0
+
+
+def new_window(known_count):
+    return lambda driver: len(driver.window_handles) > known_count
+
+
+def wait_for_ready(driver, *conditions, timeout=None, network_idle=True, idle_ms=NETWORK_IDLE_MS):
+    # Returns as soon as the document has loaded, the network has gone quiet and
+    # every condition holds; returns False instead of raising once timeout expires.
+    deadline = time.monotonic() + (READY_TIMEOUT if timeout is None else timeout)
+    tracker = tracker_for(driver)
+    while True:
+        if network_idle and tracker.enabled:
+            tracker.update(driver)
+        try:
+            ready = driver.execute_script("return document.readyState") == "complete"
+            ready = ready and all(condition(driver) for condition in conditions)
+        except WebDriverException:
+            # Page is mid-navigation or the window is still being created
+            ready = False
+        if ready and network_idle and tracker.enabled:
+            ready = tracker.idle(idle_ms)
+        if ready:
+            return True
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(POLL_INTERVAL)
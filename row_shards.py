@@ -0,0 +1,78 @@
+import threading
+
+
+class RowShards:
+    # Splits a table's [start, end) row range into contiguous shards that
+    # several browser sessions work through. A session that runs out of rows
+    # steals the back half of the largest remaining shard, so every row index
+    # is handed out exactly once.
+    def __init__(self, start, end, count):
+        count = max(1, min(count, end - start))
+        self.start = start
+        self.end = end
+        self._lock = threading.Lock()
+        self._ranges = []
+        self._owned = []
+        size, extra = divmod(end - start, count)
+        lo = start
+        for i in range(count):
+            hi = lo + size + (1 if i < extra else 0)
+            self._ranges.append([lo, hi])
+            self._owned.append(False)
+            lo = hi
+
+    def attach(self):
+        # Give a newly arrived session the first shard nobody is working on yet
+        with self._lock:
+            for slot, (lo, hi) in enumerate(self._ranges):
+                if not self._owned[slot] and lo < hi:
+                    self._owned[slot] = True
+                    return slot
+            if not self._remaining():
+                return None
+            self._ranges.append([self.end, self.end])
+            self._owned.append(True)
+            return len(self._ranges) - 1
+
+    def claim(self, slot):
+        with self._lock:
+            current = self._ranges[slot]
+            if current[0] >= current[1]:
+                if not self._steal(slot):
+                    return None
+                current = self._ranges[slot]
+            index = current[0]
+            current[0] += 1
+            return index
+
+    def detach(self, slot):
+        # Hand back whatever is left of the shard so another session can pick it up
+        with self._lock:
+            self._owned[slot] = False
+
+    def remaining(self):
+        with self._lock:
+            return self._remaining()
+
+    def _remaining(self):
+        return sum(hi - lo for lo, hi in self._ranges)
+
+    def _steal(self, slot):
+        best, best_left = None, 0
+        for victim, (lo, hi) in enumerate(self._ranges):
+            left = hi - lo
+            # An owned shard with a single row left will be finished by its owner
+            if victim == slot or left == 0 or (self._owned[victim] and left < 2):
+                continue
+            if left > best_left:
+                best, best_left = victim, left
+        if best is None:
+            return False
+        victim = self._ranges[best]
+        if self._owned[best]:
+            mid = victim[0] + (best_left + 1) // 2
+        else:
+            mid = victim[0]
+        self._ranges[slot] = [mid, victim[1]]
+        victim[1] = mid
+        return True
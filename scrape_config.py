@@ -0,0 +1,15 @@
+import os
+
+# Scrape settings the web processes need too (limits and /scrape defaults).
+# Kept apart from scraper.py so importing them does not load Selenium, the
+# proxy pool or a driver recording.
+MAX_WORKERS = int(os.environ.get("MAX_WORKERS", 4))
+BROWSER_POOL_SIZE = int(os.environ.get("BROWSER_POOL_SIZE", max(2, MAX_WORKERS)))
+FINGERPRINT_COLUMNS = [int(c) for c in os.environ.get("FINGERPRINT_COLUMNS", "").split(",") if c.strip()]
+DEFAULT_ERROR_KEYWORDS = [
+    'no data', 'session expired', 'error', 'maintenance', 'not available', 'temporarily unavailable', 'try again later', 'invalid', 'unauthorized', 'forbidden',
+    'user validation required to continue'
+]
+ERROR_KEYWORDS = [k.strip() for k in os.environ.get("ERROR_KEYWORDS", "").split("|") if k.strip()] or DEFAULT_ERROR_KEYWORDS
+ERROR_CONTAINER_SELECTOR = os.environ.get("ERROR_CONTAINER_SELECTOR")  # limit the scan to this element's visible text
+RECORD_READY_SELECTOR = os.environ.get("RECORD_READY_SELECTOR")  # optional CSS selector a record page must contain
@@ -0,0 +1,796 @@
+from selenium import webdriver
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.common.by import By
+from selenium.webdriver.chrome.service import Service
+from selenium.common.exceptions import TimeoutException
+import base64, hashlib, os, re, queue, tempfile, time, weakref
+from urllib.parse import urlsplit
+from threading import Event, Lock, Thread, local
+from browser_pool import BrowserPool
+from driver_cache import resolve_chromedriver
+from row_shards import RowShards
+from checkpoint import CheckpointJournal
+from manifest import RowManifest
+from archive import ArchiveWriter
+from proxy_pool import ProxyPool
+from session_cache import SESSION_CACHE, SessionCache, capture_session, restore_session
+from maintenance import maintenance_calendar
+from metrics import metrics
+from job_trace import JobTrace
+from lean_profile import lean_enabled, apply_lean_options, block_requests
+from readiness import wait_for_ready, forget_network, element_present, new_window
+from driver_replay import driver_recorder, replay_source
+from concurrency import site_limit, remember_site
+from scrape_config import MAX_WORKERS, BROWSER_POOL_SIZE, FINGERPRINT_COLUMNS
+
+# The scrape pipeline. Runs inside job worker processes (see jobs.py), one job
+# state dict per job; nothing here touches Flask.
+
+_log_context = local()
+DOWNLOAD_DIR = os.path.abspath("pdf_output")  # launch-time default; switched per job by the pool
+MIN_SHARD_ROWS = int(os.environ.get("MIN_SHARD_ROWS", 10))  # tables smaller than this per shard are not split
+ROW_XPATH = '//tr[starts-with(@id, "R")]'
+# Returns [id, col0, col1, col2, *extra columns] per row; arguments[0] lists extra column indexes
+ROW_METADATA_SCRIPT = """
+var columns = [0, 1, 2].concat(arguments[0] || []);
+return Array.from(document.querySelectorAll('tr[id^="R"]'), function (tr) {
+    var cells = tr.getElementsByTagName('td');
+    return [tr.id].concat(columns.map(function (i) { return i < cells.length ? cells[i].innerText : null; }));
+});
+"""
+# Scans only rendered text (no markup, scripts or attributes) and returns the matching keyword's index or -1
+DETECT_ERROR_SCRIPT = """
+var root = (arguments[1] && document.querySelector(arguments[1])) || document.body;
+if (!root) return -1;
+var match = new RegExp(arguments[0], 'i').exec(root.innerText || '');
+if (!match) return -1;
+for (var i = 1; i < match.length; i++) if (match[i] !== undefined) return i - 1;
+return -1;
+"""
+CLICK_ROW_SCRIPT = "var row = document.getElementById(arguments[0]); if (!row) return false; row.click(); return true;"
+TABLE_READY_TIMEOUT = float(os.environ.get("TABLE_READY_TIMEOUT", 13))
+PDF_CHUNK_SIZE = int(os.environ.get("PDF_CHUNK_SIZE", 1 << 20))  # bytes per IO.read when streaming printed PDFs
+# Error keywords that mean the login is gone rather than the record being bad
+MAINTENANCE_MARGIN = float(os.environ.get("MAINTENANCE_MARGIN", 30))  # seconds of slack before a maintenance window
+SESSION_EXPIRED_KEYWORDS = [k.strip() for k in os.environ.get("SESSION_EXPIRED_KEYWORDS", "session expired|unauthorized").split("|") if k.strip()]
+# Error keywords that mean the site is shedding load; with adaptive concurrency the row is retried at a lower limit
+THROTTLE_KEYWORDS = [k.strip() for k in os.environ.get("THROTTLE_KEYWORDS", "temporarily unavailable|try again later|too many requests").split("|") if k.strip()]
+THROTTLE_RETRIES = int(os.environ.get("THROTTLE_RETRIES", 3))      # extra tries per row after throttling or a timeout
+THROTTLE_BACKOFF = float(os.environ.get("THROTTLE_BACKOFF", 5))    # seconds before the first retry, growing linearly
+
+def log_message(message, level='INFO'):
+    # Messages from parallel workers carry the worker tag after any level prefix
+    message = getattr(_log_context, 'tag', '') + message
+    # Remove the level prefix for most messages to match the desired format
+    if level not in ['INFO', 'SUCCESS']:
+        # Keep the prefix only for errors and warnings
+        prefix = {
+            'ERROR': '[ERROR] ',
+            'WARNING': '[WARNING] '
+        }.get(level, '')
+        message = prefix + message
+    print(message)
+    # Route the line to the job this thread is working for
+    job = getattr(_log_context, 'job', None)
+    if job is not None:
+        job["emit"](message)
+
+# Egress proxies from proxies.txt, shared by every browser this worker process launches
+proxy_pool = ProxyPool.from_file(
+    failure_limit=int(os.environ.get("PROXY_FAILURE_LIMIT", 3)),
+    quarantine_seconds=int(os.environ.get("PROXY_QUARANTINE_SECONDS", 60)),
+    log=log_message,
+)
+proxy_of = weakref.WeakKeyDictionary()  # driver -> the Proxy it was launched with
+session_cache = SessionCache()
+
+def get_chrome_options(save_location, proxy=None):
+    options = Options()
+    options.add_argument("--disable-gpu")
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    options.add_argument("--window-size=1920,1080")
+    
+    # Set download preferences
+    prefs = {
+        "download.default_directory": save_location,
+        "download.prompt_for_download": False,
+        "download.directory_upgrade": True,
+        "safebrowsing.enabled": True
+    }
+    if lean_enabled():
+        prefs.update(apply_lean_options(options))
+    options.add_experimental_option("prefs", prefs)
+    # Network events feed the readiness checks in readiness.py
+    options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+    if proxy is not None:
+        options.add_argument(f"--proxy-server={proxy.server_arg()}")
+    return options
+
+def initialize_driver(save_dir, proxy=None):
+    driver_path = None
+    try:
+        # Resolved once and cached on disk; no network round trip per launch
+        driver_path = resolve_chromedriver()
+        log_message(f"Using ChromeDriver at: {driver_path}", level='INFO')
+        
+        # Create service with explicit path
+        service = Service(executable_path=driver_path)
+        
+        # Initialize Chrome with options
+        options = get_chrome_options(save_dir, proxy)
+        driver = webdriver.Chrome(service=service, options=options)
+        return driver
+    except Exception as e:
+        log_message(f"Error initializing ChromeDriver: {str(e)}", level='ERROR')
+        if "not a valid Win32 application" in str(e):
+            log_message("This error typically occurs when ChromeDriver is not compatible with your system.", level='WARNING')
+            log_message("Please ensure you have the latest version of Chrome browser installed.", level='WARNING')
+            log_message("You may need to manually download ChromeDriver from: https://chromedriver.chromium.org/downloads", level='WARNING')
+            log_message("After downloading, extract chromedriver.exe and place it in: " + os.path.dirname(driver_path or ''), level='WARNING')
+        raise
+
+def launch_browser():
+    # Chrome takes its proxy at launch, so each pooled browser is pinned to one
+    # proxy; rotation happens as browsers are recycled or their proxy is quarantined
+    if replay_source is not None:
+        # Recorded sessions stand in for Chrome; no browser, proxy or network
+        return replay_source.open()
+    proxy = proxy_pool.acquire()
+    try:
+        driver = initialize_driver(DOWNLOAD_DIR, proxy)
+    except Exception:
+        proxy_pool.release(proxy)
+        raise
+    if driver_recorder is not None:
+        driver = driver_recorder.wrap(driver)
+    proxy_of[driver] = proxy
+    return driver
+
+def create_browser_pool():
+    # One warm pool per worker process; the download directory is switched per checkout
+    return BrowserPool(
+        launch_browser,
+        size=BROWSER_POOL_SIZE,
+        min_idle=int(os.environ.get("BROWSER_POOL_MIN_IDLE", 1)),
+        idle_timeout=int(os.environ.get("BROWSER_IDLE_TIMEOUT", 900)),
+        max_rows=int(os.environ.get("BROWSER_MAX_ROWS", 500)),
+        log=log_message,
+        validate=lambda driver: proxy_pool.usable(proxy_of.get(driver)),
+        on_discard=lambda driver: proxy_pool.release(proxy_of.pop(driver, None)),
+    )
+
+class UnexpectedContentError(Exception):
+    def __init__(self, message, keyword=None):
+        super().__init__(message)
+        self.keyword = keyword
+
+class RecordTimeoutError(Exception):
+    pass
+
+def compile_error_pattern(keywords):
+    # One capture group per keyword, matched on word boundaries so e.g. "error" no longer hits "errorHandler".
+    # A blank keyword would match every page; it keeps its group, so indexes still line up with the list, but never matches.
+    groups = [re.escape(k.strip().lower()).replace("\\ ", r"\s+") if k.strip() else "(?!)" for k in keywords]
+    return r"\b(?:" + "|".join("(" + g + ")" for g in groups) + r")\b"
+
+def stage_timer(job, table_idx):
+    # Records one pipeline stage's duration under the job's and table's labels
+    labels = {"job": job.get("id", ""), "table": str(table_idx + 1)}
+    return lambda stage, seconds: metrics.observe("scraper_stage_seconds", seconds, stage=stage, **labels)
+
+def trace_span(job, name, started, **args):
+    # Closes a span that began at started (time.monotonic()) if the job is traced
+    if job["trace"] is not None:
+        job["trace"].span(name, started, time.monotonic(), **args)
+
+def open_table(driver, job, table_idx, table_url, rows=None):
+    log_message(f"Opening table URL {table_idx + 1}", level='INFO')
+    started = time.monotonic()
+    forget_network(driver)
+    if lean_enabled():
+        # Open a blank window first so blocking is in place before the table loads
+        driver.execute_script("window.open('about:blank', '_blank');")
+        driver.switch_to.window(driver.window_handles[-1])
+        block_requests(driver)
+        driver.get(table_url)
+    else:
+        driver.execute_script(f"window.open('{table_url}', '_blank');")
+        driver.switch_to.window(driver.window_handles[-1])
+
+    # Rows being present is enough even if the page never goes fully network-idle
+    present = wait_for_ready(driver, element_present(ROW_XPATH, By.XPATH), timeout=TABLE_READY_TIMEOUT)
+    trace_span(job, "table_wait", started, table=table_idx + 1)
+    if rows is None or not present:
+        # Every row's id and naming cells in one round trip, reused for the whole table
+        discovering = time.monotonic()
+        rows = driver.execute_script(ROW_METADATA_SCRIPT, job["fingerprint_columns"]) or []
+        trace_span(job, "row_discovery", discovering, table=table_idx + 1, rows=len(rows))
+    stage_timer(job, table_idx)("table_wait", time.monotonic() - started)
+    if rows:
+        log_message(f"Found {len(rows)} rows in table {table_idx + 1}", level='INFO')
+        return rows
+    else:
+        log_message(f"Table {table_idx + 1} took too long to load or has too much data. Skipping this table.", level='WARNING')
+        close_table(driver)
+        return None
+
+def close_table(driver):
+    driver.close()
+    driver.switch_to.window(driver.window_handles[0])
+
+def print_pdf_to_file(driver, path, chunk_size=None, observe=None, trace=None):
+    # Stream the PDF out of Chrome in chunks so peak memory is bounded by the chunk size.
+    # observe(stage, seconds) gets the print, transfer and file write times;
+    # trace(name, started) is called at the end of each step, chunk by chunk.
+    trace = trace or (lambda name, started: None)
+    chunk_size = chunk_size or PDF_CHUNK_SIZE
+    started = time.monotonic()
+    result = driver.execute_cdp_cmd("Page.printToPDF", {"printBackground": True, "transferMode": "ReturnAsStream"})
+    printed = time.monotonic()
+    trace("print", started)
+    handle = result.get("stream")
+    # A temporary name of its own, so two prints never share a partial file
+    fd, partial_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".part")
+    written = 0
+    digest = hashlib.sha256()
+    write_seconds = [0.0]
+    try:
+        with os.fdopen(fd, "wb") as out:
+            def write(data):
+                # Hash while writing so the checkpoint journal never has to re-read the file
+                write_started = time.monotonic()
+                digest.update(data)
+                count = out.write(data)
+                write_seconds[0] += time.monotonic() - write_started
+                trace("file_write", write_started)
+                return count
+
+            def decode(data):
+                decode_started = time.monotonic()
+                data = base64.b64decode(data)
+                trace("base64_decode", decode_started)
+                return data
+
+            if handle is None:
+                # Browser ignored transferMode and returned the whole document inline
+                written = write(decode(result['data']))
+            else:
+                pending = ""
+                try:
+                    while True:
+                        reading = time.monotonic()
+                        chunk = driver.execute_cdp_cmd("IO.read", {"handle": handle, "size": chunk_size})
+                        trace("pdf_read", reading)
+                        if chunk.get("base64Encoded"):
+                            # Decode only whole 4-character groups; carry the rest into the next chunk
+                            pending += chunk.get("data", "")
+                            usable = len(pending) - len(pending) % 4
+                            written += write(decode(pending[:usable]))
+                            pending = pending[usable:]
+                        else:
+                            written += write(chunk.get("data", "").encode("utf-8"))
+                        if chunk.get("eof"):
+                            break
+                    if pending:
+                        written += write(decode(pending))
+                finally:
+                    driver.execute_cdp_cmd("IO.close", {"handle": handle})
+    except Exception:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        raise
+    # Only a complete file ever appears under the final name (mkstemp made it private)
+    os.chmod(partial_path, 0o644)
+    os.replace(partial_path, path)
+    if observe is not None:
+        observe("print", printed - started)
+        observe("pdf_transfer", time.monotonic() - printed - write_seconds[0])
+        observe("file_write", write_seconds[0])
+    return written, digest.hexdigest()
+
+def row_filename(row, table_idx, index):
+    # Row metadata is [id, waqf_id, property_id, district, ...]; missing cells read as "unknown"
+    cells = ["unknown" if cell is None else cell.strip() for cell in row[1:4]]
+    if not row[0]:
+        return f"table{table_idx+1}_row{index+1}.pdf"  # Fallback to original naming
+    filename = "_".join(cells) + ".pdf"
+    # Clean filename to remove any invalid characters
+    return "".join(c for c in filename if c.isalnum() or c in ('_', '-', '.'))
+
+def claim_filename(job, table_idx, index, row):
+    # Rows whose cells give the same name (duplicates, or all cells missing) would
+    # overwrite each other's PDF and journal digest, so a name already taken in this
+    # job gets the row id appended. A row keeps its name across retries and, through
+    # the manifest, across runs.
+    table_url = job["table_urls"][table_idx]
+    key = (table_url, row[0] or index)
+    with job["lock"]:
+        filename = job["filenames"].get(key)
+        if filename is not None:
+            return filename
+        filename = job["manifest"].filename(table_url, row[0]) if row[0] else None
+        if filename is None or filename in job["claimed"]:
+            filename = row_filename(row, table_idx, index)
+            stem = filename[:-len(".pdf")] + "_" + "".join(c for c in str(row[0] or index + 1) if c.isalnum() or c in ('_', '-'))
+            n = 1
+            while filename in job["claimed"]:
+                filename = f"{stem}.pdf" if n == 1 else f"{stem}_{n}.pdf"
+                n += 1
+        job["filenames"][key] = filename
+        job["claimed"].add(filename)
+    return filename
+
+def detect_error(driver, job):
+    # Index of the first error keyword shown in the current window, or -1
+    match = driver.execute_script(DETECT_ERROR_SCRIPT, job["error_pattern"], job["error_container"])
+    return match if match is not None else -1
+
+def scrape_row(driver, job, table_idx, index, row):
+    log_message(f"Processing row {index + 1}", level='INFO')
+    observe = stage_timer(job, table_idx)
+    where = {"table": table_idx + 1, "row": index + 1, "id": row[0]}
+    started = time.monotonic()
+    window_count = len(driver.window_handles)
+    forget_network(driver)
+    if not driver.execute_script(CLICK_ROW_SCRIPT, row[0]):
+        raise Exception(f"Row {index + 1} ({row[0]}) is no longer in the table")
+    opened = wait_for_ready(driver, new_window(window_count), network_idle=False)
+    clicked = time.monotonic()
+    observe("row_click", clicked - started)
+    trace_span(job, "click", started, **where)
+
+    filename = claim_filename(job, table_idx, index, row)
+
+    if not opened:
+        raise RecordTimeoutError(f"Row {index + 1} did not open a record window")
+    switching = time.monotonic()
+    driver.switch_to.window(driver.window_handles[-1])
+    if lean_enabled():
+        # Too late for the first requests, but keeps lazy-loaded media and trackers out
+        block_requests(driver)
+    trace_span(job, "window_switch", switching, **where)
+    # An error page never shows the record, so stop waiting as soon as a keyword is on the page
+    record_conditions = []
+    if job["record_selector"]:
+        record_present = element_present(job["record_selector"])
+        record_conditions.append(lambda driver: record_present(driver) or detect_error(driver, job) >= 0)
+    waiting = time.monotonic()
+    if not wait_for_ready(driver, *record_conditions):
+        log_message(f"Record page for row {index + 1} not fully settled; printing anyway", level='WARNING')
+    observe("record_wait", time.monotonic() - waiting)
+    trace_span(job, "record_wait", waiting, **where)
+
+    # Check the record page for error/placeholder content; only the matched keyword index comes back
+    scanning = time.monotonic()
+    match = detect_error(driver, job)
+    observe("error_check", time.monotonic() - scanning)
+    trace_span(job, "keyword_scan", scanning, **where)
+    if match >= 0:
+        keyword = job["error_keywords"][match]
+        raise UnexpectedContentError(f"Unexpected content detected on row {index + 1} ('{keyword}')", keyword)
+
+    size, digest = print_pdf_to_file(
+        driver, os.path.join(job["save_dir"], filename), observe=observe,
+        trace=lambda name, began: trace_span(job, name, began, **where),
+    )
+    log_message(f" Saved: {filename}", level='SUCCESS')
+
+    closing = time.monotonic()
+    driver.close()
+    driver.switch_to.window(driver.window_handles[-1])
+    trace_span(job, "tab_close", closing, **where)
+    trace_span(job, "row", started, file=filename, bytes=size, **where)
+    return filename, size, digest
+
+def job_running(job):
+    return not job["abort"].is_set() and not job["stop"].is_set()
+
+def next_work(job):
+    # Fresh tables first; once they run out, help finish tables that are being sharded
+    try:
+        table_idx, table_url = job["tables"].get_nowait()
+        return table_idx, table_url, None, None
+    except queue.Empty:
+        pass
+    with job["lock"]:
+        for table_idx, shared in list(job["sharded"].items()):
+            slot = shared["shards"].attach()
+            if slot is None:
+                del job["sharded"][table_idx]
+                continue
+            return table_idx, shared["url"], shared, slot
+    return None
+
+def sign_in(worker, job, newer_than=None):
+    # Reuse the saved login for this URL if there is one; otherwise log in and save it
+    driver = worker["driver"]
+    login_url = job["login_url"]
+    worker["session"] = None
+    with session_cache.lock(login_url):
+        session = session_cache.get(login_url) if SESSION_CACHE else None
+        if session is not None and newer_than is not None and session["captured"] < newer_than:
+            session = None
+        if session is not None:
+            try:
+                restore_session(driver, session)
+                worker["session"] = session
+                log_message("Reusing saved login session", level='INFO')
+                return
+            except Exception as e:
+                log_message(f"Could not restore saved session: {str(e)}", level='WARNING')
+
+        driver.get(login_url)
+        wait_for_ready(driver)
+        log_message("Opened login page", level='INFO')
+        if not SESSION_CACHE:
+            return
+        # Only a login page that looks healthy is worth handing to other browsers
+        if detect_error(driver, job) >= 0:
+            return
+        try:
+            cookies, local_storage, origin = capture_session(driver)
+            if cookies:
+                session_cache.store(login_url, cookies, local_storage, origin)
+        except Exception as e:
+            log_message(f"Could not save login session: {str(e)}", level='WARNING')
+
+def print_row(worker, job, table_idx, index, row):
+    driver = worker["driver"]
+    try:
+        return scrape_row(driver, job, table_idx, index, row)
+    except UnexpectedContentError as e:
+        session = worker["session"]
+        if session is None or e.keyword not in SESSION_EXPIRED_KEYWORDS:
+            raise
+        # The site says the reused login has expired: log in again and give the row one more try
+        log_message("Saved login session expired; logging in again", level='WARNING')
+        session_cache.invalidate(job["login_url"], session["captured"])
+        main_window, table_window = close_record_windows(driver)
+        driver.switch_to.window(main_window)
+        sign_in(worker, job)
+        driver.switch_to.window(table_window)
+        worker["session"] = None  # a second expiry in a row is a real error
+        return scrape_row(driver, job, table_idx, index, row)
+
+def close_record_windows(driver):
+    # Back to the login and table windows after a row failed part-way
+    main_window, table_window = driver.window_handles[:2]
+    for handle in driver.window_handles[2:]:
+        driver.switch_to.window(handle)
+        driver.close()
+    driver.switch_to.window(table_window)
+    return main_window, table_window
+
+def throttle_reason(e):
+    # Why a failed row counts against the site's load, or None if it does not
+    if isinstance(e, UnexpectedContentError):
+        return "throttled" if e.keyword in THROTTLE_KEYWORDS else None
+    if isinstance(e, (RecordTimeoutError, TimeoutException)):
+        return "timeout"
+    return None
+
+def print_row_paced(worker, job, table_idx, index, row):
+    # print_row under the job's adaptive limit: waits for a slot, tells the
+    # limiter how the row went and, after throttling or a timeout, backs off
+    # and tries again. Returns (filename, size, digest, seconds), or None if
+    # the job stopped while waiting.
+    limiter = job["concurrency"]
+    if limiter is None:
+        started = time.monotonic()
+        return print_row(worker, job, table_idx, index, row) + (time.monotonic() - started,)
+    attempt = 0
+    while True:
+        started = limiter.acquire(lambda: job_running(job))
+        if started is None:
+            return None
+        try:
+            filename, size, digest = print_row(worker, job, table_idx, index, row)
+        except Exception as e:
+            reason = None if job["abort"].is_set() else throttle_reason(e)
+            limiter.release(started, reason=reason)
+            if reason is None or attempt >= THROTTLE_RETRIES or not job_running(job):
+                raise
+            attempt += 1
+            proxy_pool.record(proxy_of.get(worker["driver"]), False)
+            metrics.inc("scraper_row_retries_total", reason=reason, job=job.get("id", ""), table=str(table_idx + 1))
+            log_message(f"Site pushed back on row {index + 1} ({reason}); now at most {limiter.snapshot()['limit']} browser(s), retrying", level='WARNING')
+            job["abort"].wait(THROTTLE_BACKOFF * attempt)
+            close_record_windows(worker["driver"])
+            continue
+        elapsed = time.monotonic() - started
+        limiter.release(started, seconds=elapsed)
+        return filename, size, digest, elapsed
+
+def wait_for_maintenance(worker, job):
+    # Called at row boundaries. Pauses while the site is in maintenance, or when
+    # the next row, at this worker's measured pace, would run into a window.
+    # Returns the end of the window waited out, or None if there was no pause.
+    now = time.time()
+    until = maintenance_calendar.maintenance_until(now)
+    if until is None:
+        start = maintenance_calendar.next_maintenance(now)
+        if start is None or now + 1.5 * (worker["row_seconds"] or 0) + MAINTENANCE_MARGIN < start:
+            return None
+        until = maintenance_calendar.maintenance_until(start)
+        log_message(f"Next row would run into the maintenance window; pausing until {maintenance_calendar.describe(until)}", level='INFO')
+    else:
+        log_message(f"Website under maintenance; pausing until {maintenance_calendar.describe(until)}", level='INFO')
+    job["update"]({"pausedUntil": until})
+    while job_running(job):
+        remaining = until - time.time()
+        if remaining > 0:
+            job["abort"].wait(min(remaining, 5))
+            continue
+        # Back-to-back windows keep the pause going
+        later = maintenance_calendar.maintenance_until(time.time())
+        if later is None:
+            break
+        until = later
+    job["update"]({"pausedUntil": None})
+    if job_running(job):
+        log_message("Maintenance window over; resuming", level='INFO')
+    return until
+
+def reopen_after_maintenance(worker, job, window_end):
+    # The site may have dropped sessions during maintenance: log in again
+    # (once per login URL, the other workers reuse it) and reload the table
+    driver = worker["driver"]
+    table_window = driver.current_window_handle
+    driver.switch_to.window(driver.window_handles[0])
+    sign_in(worker, job, newer_than=window_end)
+    driver.switch_to.window(table_window)
+    driver.refresh()
+    wait_for_ready(driver, element_present(ROW_XPATH, By.XPATH), timeout=TABLE_READY_TIMEOUT)
+
+def process_table(worker, job, table_idx, table_url, shared=None, slot=None):
+    driver = worker["driver"]
+    rows = open_table(driver, job, table_idx, table_url, rows=shared["rows"] if shared else None)
+    if rows is None:
+        if shared is not None:
+            shared["shards"].detach(slot)
+        return
+
+    if shared is None:
+        # Calculate the end index for the loop
+        end_index = len(rows)
+        if job["last_index"] is not None:
+            end_index = min(job["last_index"], len(rows))
+        start_index = min(job["start_index"], end_index)
+        indices = list(range(start_index, end_index))
+        if job["incremental"]:
+            # Only rows that are new or whose cells changed since the last run
+            indices = [i for i in indices if job["manifest"].changed(table_url, rows[i], job["save_dir"])]
+            log_message(f"Incremental: {len(indices)} of {end_index - start_index} rows in table {table_idx + 1} are new or changed", level='INFO')
+
+        # Shards cover positions in the indices list, so sparse incremental work splits evenly too
+        shard_count = min(job["shards"], len(indices) // MIN_SHARD_ROWS)
+        shards = RowShards(0, len(indices), max(1, shard_count))
+        slot = shards.attach()
+        if shard_count > 1:
+            log_message(f"Splitting {len(indices)} rows of table {table_idx + 1} into {shard_count} shards", level='INFO')
+            with job["lock"]:
+                job["sharded"][table_idx] = {"url": table_url, "shards": shards, "rows": rows, "indices": indices}
+    else:
+        shards = shared["shards"]
+        indices = shared["indices"]
+        log_message(f"Joining table {table_idx + 1} ({shards.remaining()} rows left)", level='INFO')
+
+    labels = {"job": job.get("id", ""), "table": str(table_idx + 1)}
+    try:
+        while job_running(job) and slot is not None:
+            until = wait_for_maintenance(worker, job)
+            if until is not None and job_running(job):
+                reopen_after_maintenance(worker, job, until)
+            position = shards.claim(slot)
+            if position is None:
+                break
+            index = indices[position]
+            if index >= len(rows):
+                # Table shrank since it was split; nothing to print at this index
+                continue
+            row = rows[index]
+            if job["resume"] and job["journal"].is_done(table_url, row[0], job["save_dir"]):
+                log_message(f"Skipping row {index + 1} (already saved)", level='INFO')
+                metrics.inc("scraper_rows_total", status="skipped", **labels)
+                continue
+            try:
+                saved = print_row_paced(worker, job, table_idx, index, row)
+            except Exception:
+                if not job["abort"].is_set():
+                    proxy_pool.record(proxy_of.get(driver), False)
+                    metrics.inc("scraper_rows_total", status="failed", **labels)
+                raise
+            if saved is None:
+                break
+            filename, size, digest, elapsed = saved
+            metrics.observe("scraper_stage_seconds", elapsed, stage="row", **labels)
+            metrics.inc("scraper_rows_total", status="saved", **labels)
+            metrics.inc("scraper_bytes_written_total", size, **labels)
+            proxy_pool.record(proxy_of.get(driver), True, elapsed)
+            worker["row_seconds"] = elapsed if worker["row_seconds"] is None else 0.8 * worker["row_seconds"] + 0.2 * elapsed
+            job["journal"].record(job["id"], table_url, row[0], filename, size, digest)
+            job["manifest"].update(table_url, row, filename)
+            if job["archive"] is not None:
+                job["archive"].add(filename)
+            worker["rows"] += 1
+            with job["lock"]:
+                job["rows_saved"] += 1
+                rows_saved = job["rows_saved"]
+            job["report"](rows_saved)
+    finally:
+        if slot is not None:
+            shards.detach(slot)
+
+    close_table(driver)
+
+def scrape_worker(job, worker_idx):
+    # Each worker logs in with its own browser and pulls tables off the shared queue
+    _log_context.job = job
+    _log_context.tag = f"[W{worker_idx + 1}] " if job["workers"] > 1 else ''
+    worker = {"driver": None, "rows": 0, "session": None, "row_seconds": None}
+    try:
+        driver = worker["driver"] = job["pool"].acquire(job["save_dir"])
+        job["drivers"].add(driver)
+
+        proxy = proxy_of.get(driver)
+        if proxy is not None:
+            log_message(f"Using proxy {proxy.label}", level='INFO')
+
+        if lean_enabled():
+            block_requests(driver)
+        wait_for_maintenance(worker, job)
+        sign_in(worker, job)
+
+        while job_running(job):
+            work = next_work(job)
+            if work is None:
+                break
+            process_table(worker, job, *work)
+
+    except Exception as e:
+        # An abort quits the browsers underneath us; that is not a job error
+        if not job["abort"].is_set():
+            if isinstance(e, UnexpectedContentError):
+                log_message(f"Error: {str(e)}. Stopping automation.", level='ERROR')
+            else:
+                log_message("Error: " + str(e), level='ERROR')
+            job["errors"].append(e)
+        job["stop"].set()
+
+    finally:
+        if worker["driver"] is not None:
+            job["drivers"].discard(worker["driver"])
+            try:
+                # Hand the browser back to the pool; dead or worn-out ones are replaced there
+                job["pool"].release(worker["driver"], rows=worker["rows"])
+                log_message("Browser returned to pool", level='INFO')
+            except Exception as e:
+                log_message(f"Error releasing browser: {str(e)}", level='ERROR')
+        _log_context.tag = ''
+        _log_context.job = None
+
+
+def job_logger(job):
+    # log_message for threads that work for a job but are not one of its workers
+    def log(message, level='INFO'):
+        _log_context.job = job
+        log_message(message, level)
+    return log
+
+def build_job(spec, pool, emit, report=None, update=None):
+    # spec is the plain, picklable description of a job created by /scrape;
+    # emit receives log lines, report the running count of saved rows and
+    # update changes to the job record (e.g. a maintenance pause)
+    job = dict(spec)
+    job.update({
+        "pool": pool,
+        "emit": emit,
+        "report": report or (lambda rows: None),
+        "update": update or (lambda changes: None),
+        "error_pattern": compile_error_pattern(spec["error_keywords"]),
+        "tables": queue.Queue(),
+        "sharded": {},  # table_idx -> {"url", "shards", "rows"} open for other workers to join
+        "lock": Lock(),
+        "stop": Event(),
+        "abort": Event(),
+        "drivers": set(),  # browsers currently checked out by this job's workers
+        "errors": [],
+        "rows_saved": 0,
+        "filenames": {},  # (table URL, row id) -> file name given to the row
+        "claimed": set(),  # file names given out so far
+        "journal": CheckpointJournal.for_folder(spec["folder_name"]),
+        "manifest": RowManifest.for_folder(spec["folder_name"]).load(),
+        "archive": None,
+        "trace": JobTrace.for_job(spec["id"]) if spec.get("trace") else None,
+        "concurrency": None,
+    })
+    if spec.get("archive"):
+        job["archive"] = ArchiveWriter(spec["save_dir"], job_logger(job))
+    job.setdefault("resume", False)
+    job.setdefault("incremental", False)
+    job.setdefault("fingerprint_columns", FINGERPRINT_COLUMNS)
+    if (driver_recorder is not None or replay_source is not None) and job["workers"] > 1:
+        # Which browser gets which rows depends on timing; one browser keeps recordings replayable call for call
+        job_logger(job)("Recording or replaying browser sessions: using a single browser", level='WARNING')
+        _log_context.job = None
+        job["workers"] = job["shards"] = 1
+    if spec.get("adaptive"):
+        job["concurrency"] = site_limit(urlsplit(spec["login_url"]).netloc, job["workers"],
+                                        on_change=lambda snapshot: concurrency_changed(job, snapshot))
+    for table_idx, table_url in enumerate(spec["table_urls"]):
+        job["tables"].put((table_idx, table_url))
+    return job
+
+def concurrency_changed(job, snapshot):
+    metrics.set("scraper_concurrency_limit", snapshot["limit"], job=job.get("id", ""))
+    if snapshot["rate"] is not None:
+        metrics.set("scraper_rate_limit", snapshot["rate"], job=job.get("id", ""))
+    job["update"]({"concurrency": snapshot})
+
+def run_job(job):
+    _log_context.job = job
+    try:
+        log_message(f"PDFs will be saved to: {job['save_dir']}", level='INFO')
+        if job["resume"]:
+            done = job["journal"].load()
+            log_message(f"Resuming: {done} row(s) recorded as saved in earlier runs", level='INFO')
+        if job["workers"] > 1:
+            log_message(f"Processing {len(job['table_urls'])} table(s) with {job['workers']} browsers", level='INFO')
+        if job["archive"] is not None:
+            job["archive"].start()
+        if job["concurrency"] is not None:
+            snapshot = job["concurrency"].snapshot()
+            log_message(f"Adaptive concurrency: starting with {snapshot['limit']} of {snapshot['maxWorkers']} browser(s) working", level='INFO')
+            concurrency_changed(job, snapshot)
+    finally:
+        _log_context.job = None
+
+    threads = [
+        Thread(target=scrape_worker, args=(job, worker_idx), name=f"worker-{worker_idx + 1}", daemon=True)
+        for worker_idx in range(job["workers"])
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    job["journal"].close()
+    job["manifest"].save()
+    if job["concurrency"] is not None:
+        remember_site(urlsplit(job["login_url"]).netloc, job["concurrency"])
+    if job["trace"] is not None:
+        job["trace"].close()
+    if job["archive"] is not None:
+        job["archive"].close()
+        job_logger(job)(f"Archive ready: pdf_output/{job['folder_name']}.zip ({job['archive'].entries} files)", level='SUCCESS')
+        _log_context.job = None
+
+    result = {"rows": job["rows_saved"]}
+    if len(proxy_pool):
+        # Health as seen by this worker process at the end of the job
+        result["proxies"] = proxy_pool.stats()
+    if job["abort"].is_set():
+        result.update(status="aborted", message="Operation aborted")
+    elif job["errors"]:
+        error = job["errors"][0]
+        result["status"] = "failed"
+        if isinstance(error, UnexpectedContentError):
+            result["message"] = "Error: Unexpected content detected (e.g., session expired, no data, or maintenance page). Automation stopped."
+        else:
+            result["message"] = f" Error: {str(error)}"
+    else:
+        result.update(status="completed", message=f" Scraping completed. PDFs saved in 'pdf_output/{job['folder_name']}' folder.")
+    return result
+
+def abort_job(job):
+    job["abort"].set()
+    _log_context.job = job
+    try:
+        for driver in list(job["drivers"]):
+            try:
+                driver.quit()
+                log_message("Browser closed due to abort request", level='INFO')
+            except Exception as e:
+                log_message(f"Error closing browser: {str(e)}", level='ERROR')
+    finally:
+        _log_context.job = None
@@ -0,0 +1,143 @@
+import multiprocessing, os, signal, socket, sys, threading
+from werkzeug.serving import make_server, WSGIRequestHandler
+from werkzeug.wsgi import ClosingIterator
+
+# Production entry point. The parent process runs the job supervisor and its
+# scrape worker processes; SERVE_WORKERS web processes share the port
+# (SO_REUSEPORT) and see jobs and logs through the SQLite job store, so any of
+# them can answer /jobs and /stream. SIGTERM or Ctrl-C drains: no new jobs are
+# accepted, running ones finish (or are aborted after SERVE_DRAIN_TIMEOUT),
+# then the web processes stop. A second signal stops at once.
+SERVE_HOST = os.environ.get("SERVE_HOST", "0.0.0.0")
+SERVE_PORT = int(os.environ.get("SERVE_PORT", 5000))
+SERVE_WORKERS = int(os.environ.get("SERVE_WORKERS", 2))            # web processes
+SERVE_THREADS = int(os.environ.get("SERVE_THREADS", 8))            # requests running app code at once, per process
+SERVE_STREAMS = int(os.environ.get("SERVE_STREAMS", 200))          # open /stream connections, per process
+SERVE_KEEPALIVE = float(os.environ.get("SERVE_KEEPALIVE", 60))     # seconds an idle connection is kept
+SERVE_DRAIN_TIMEOUT = float(os.environ.get("SERVE_DRAIN_TIMEOUT", 3600))
+
+
+def log_message(message, level='INFO'):
+    prefix = {
+        'ERROR': '[ERROR] ',
+        'WARNING': '[WARNING] '
+    }.get(level, '')
+    print(prefix + message, flush=True)
+
+
+class RequestLimiter:
+    # WSGI middleware. Every connection gets a thread, but only `threads` of
+    # them run app code at once; the rest queue. /stream connections spend
+    # nearly all their time waiting, so they have their own, larger budget and
+    # never hold up status polls or downloads.
+    def __init__(self, app, threads, streams):
+        self.app = app
+        self.slots = threading.BoundedSemaphore(threads)
+        self.stream_slots = threading.BoundedSemaphore(streams)
+
+    def __call__(self, environ, start_response):
+        slots = self.stream_slots if environ.get("PATH_INFO") == "/stream" else self.slots
+        if slots is self.stream_slots:
+            if not slots.acquire(blocking=False):
+                start_response("503 Service Unavailable", [("Content-Type", "text/plain"), ("Retry-After", "5")])
+                return [b"Too many open log streams\n"]
+        else:
+            slots.acquire()
+        try:
+            response = self.app(environ, start_response)
+        except BaseException:
+            slots.release()
+            raise
+        # Held until the response body has been sent, e.g. for a streamed ZIP
+        return ClosingIterator(response, slots.release)
+
+
+class KeepAliveHandler(WSGIRequestHandler):
+    timeout = SERVE_KEEPALIVE
+
+
+def listen_socket(host, port):
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if hasattr(socket, "SO_REUSEPORT"):
+        # Each web process binds its own socket and the kernel spreads connections across them
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(128)
+    return sock
+
+
+def web_main(host, port, threads, streams):
+    os.environ["JOB_STORE_SHARED"] = "1"
+    import app as web
+
+    sock = listen_socket(host, port)
+    server = make_server(host, port, RequestLimiter(web.app, threads, streams), threaded=True,
+                         request_handler=KeepAliveHandler, fd=sock.fileno())
+    # The parent decides when to stop; a terminal Ctrl-C reaches every process in the group
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(target=server.shutdown).start())
+    server.serve_forever()
+
+
+def main():
+    from jobs import JobSupervisor
+    from job_store import JobStore
+    from maintenance import maintenance_calendar
+
+    log_capacity = int(os.environ.get("LOG_BUFFER_LINES", 2000))
+    supervisor = JobSupervisor(
+        processes=int(os.environ.get("JOB_WORKERS", 2)),
+        log_capacity=log_capacity,
+        calendar=maintenance_calendar,
+        store=JobStore(log_capacity=log_capacity),
+    )
+    supervisor.start()
+
+    workers = SERVE_WORKERS
+    if workers > 1 and not hasattr(socket, "SO_REUSEPORT"):
+        log_message("SO_REUSEPORT is not available on this platform; running one web process", level='WARNING')
+        workers = 1
+    ctx = multiprocessing.get_context("spawn")
+    stopping = threading.Event()
+
+    def start_web(number):
+        process = ctx.Process(target=web_main, args=(SERVE_HOST, SERVE_PORT, SERVE_THREADS, SERVE_STREAMS), name=f"web-{number}")
+        process.start()
+        return process
+
+    web = [start_web(number + 1) for number in range(workers)]
+    log_message(f"Serving on {SERVE_HOST}:{SERVE_PORT} with {workers} web process(es) x {SERVE_THREADS} threads", level='INFO')
+
+    def on_signal(signum, frame):
+        if stopping.is_set():
+            log_message("Stopping without waiting for jobs", level='WARNING')
+            for process in multiprocessing.active_children():
+                process.terminate()
+            os._exit(1)
+        stopping.set()
+
+    signal.signal(signal.SIGTERM, on_signal)
+    signal.signal(signal.SIGINT, on_signal)
+
+    while not stopping.wait(1):
+        for i, process in enumerate(web):
+            if not process.is_alive():
+                log_message(f"Web process {process.name} exited with code {process.exitcode}; restarting", level='WARNING')
+                web[i] = start_web(i + 1)
+
+    # Web processes keep answering /jobs and /stream while jobs drain; /scrape answers 503
+    log_message("Shutting down: waiting for running jobs to finish", level='INFO')
+    if not supervisor.drain(SERVE_DRAIN_TIMEOUT):
+        log_message("Some jobs did not stop in time", level='WARNING')
+    for process in web:
+        process.terminate()
+    for process in web:
+        process.join(timeout=10)
+    supervisor.shutdown()
+    log_message("Server stopped", level='INFO')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
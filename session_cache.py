@@ -0,0 +1,106 @@
+import hashlib, json, os, threading, time
+
+# Saved logins hold live cookies; keep them with the other run state, outside the
+# downloadable pdf_output folders, owner-readable only
+SESSION_DIR = os.environ.get("SESSION_DIR", os.path.join(os.path.abspath("run_state"), "sessions"))
+SESSION_CACHE = os.environ.get("SESSION_CACHE", "1") == "1"
+SESSION_MAX_AGE = float(os.environ.get("SESSION_MAX_AGE", 0))  # optional hard limit in seconds; 0 trusts the site's cookies
+COOKIE_EXPIRY_MARGIN = 60  # treat cookies this close to expiring as expired
+# Fields Network.setCookies accepts from what Network.getAllCookies returns
+COOKIE_PARAMS = ("name", "value", "domain", "path", "secure", "httpOnly", "sameSite", "expires", "priority", "sourceScheme", "sourcePort")
+
+
+def session_expired(session, max_age=None, now=None):
+    now = time.time() if now is None else now
+    max_age = SESSION_MAX_AGE if max_age is None else max_age
+    if max_age and now - session["captured"] > max_age:
+        return True
+    cookies = session["cookies"]
+    # Session ids are normally httpOnly; trackers with short lifetimes should not void the login
+    auth_cookies = [c for c in cookies if c.get("httpOnly")] or cookies
+    for cookie in auth_cookies:
+        expires = cookie.get("expires", -1)
+        if not cookie.get("session") and expires > 0 and expires < now + COOKIE_EXPIRY_MARGIN:
+            return True
+    return False
+
+
+class SessionCache:
+    # Authenticated browser state (cookies and localStorage) per login URL,
+    # shared by every browser in this process and, through SESSION_DIR, by the
+    # other worker processes. The first browser logs in; the rest inject it.
+    def __init__(self, directory=SESSION_DIR, max_age=SESSION_MAX_AGE):
+        self.directory = directory
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._url_locks = {}
+
+    def _path(self, login_url):
+        return os.path.join(self.directory, hashlib.sha1(login_url.encode("utf-8")).hexdigest() + ".json")
+
+    def lock(self, login_url):
+        # Held around "reuse or log in" so parallel workers do not all log in at once
+        with self._lock:
+            return self._url_locks.setdefault(login_url, threading.Lock())
+
+    def get(self, login_url):
+        try:
+            with open(self._path(login_url), encoding="utf-8") as f:
+                session = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if session.get("login_url") != login_url or session_expired(session, self.max_age):
+            return None
+        return session
+
+    def store(self, login_url, cookies, local_storage, origin):
+        session = {"login_url": login_url, "captured": time.time(), "origin": origin, "cookies": cookies, "local_storage": local_storage}
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        path = self._path(login_url)
+        tmp_path = path + ".tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(session, f)
+        os.replace(tmp_path, path)
+        return session
+
+    def invalidate(self, login_url, captured=None):
+        # With captured set, only drop the session if nobody has replaced it since
+        path = self._path(login_url)
+        if captured is not None:
+            try:
+                with open(path, encoding="utf-8") as f:
+                    if json.load(f).get("captured") != captured:
+                        return
+            except (OSError, ValueError):
+                return
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def capture_session(driver):
+    # Cookies for every domain the login touched, plus the current origin's localStorage
+    cookies = driver.execute_cdp_cmd("Network.getAllCookies", {}).get("cookies", [])
+    local_storage = driver.execute_script("try { return Object.assign({}, window.localStorage); } catch (e) { return {}; }") or {}
+    origin = driver.execute_script("return window.location.origin")
+    return cookies, local_storage, origin
+
+
+def restore_session(driver, session):
+    cookies = []
+    for cookie in session["cookies"]:
+        param = {k: cookie[k] for k in COOKIE_PARAMS if k in cookie}
+        if cookie.get("session"):
+            param.pop("expires", None)
+        cookies.append(param)
+    if cookies:
+        driver.execute_cdp_cmd("Network.setCookies", {"cookies": cookies})
+    if session.get("local_storage") and session.get("origin"):
+        # Written straight into the origin's storage, no page load needed
+        driver.execute_cdp_cmd("DOMStorage.enable", {})
+        storage_id = {"securityOrigin": session["origin"], "isLocalStorage": True}
+        for key, value in session["local_storage"].items():
+            driver.execute_cdp_cmd("DOMStorage.setDOMStorageItem", {"storageId": storage_id, "key": key, "value": value})
+
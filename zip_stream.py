@@ -0,0 +1,68 @@
+import os, zipfile
+
+ZIP_CHUNK_SIZE = int(os.environ.get("ZIP_CHUNK_SIZE", 1 << 20))
+
+
+class _ChunkSink:
+    # Write-only, unseekable file object for ZipFile; whatever it has been given
+    # is handed to the response by stream_zip between writes
+    def __init__(self):
+        self.chunks = []
+        self.offset = 0
+
+    def write(self, data):
+        if data:
+            self.chunks.append(bytes(data))
+            self.offset += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.offset
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        chunks, self.chunks = self.chunks, []
+        return b"".join(chunks)
+
+
+def archive_members(folder_path):
+    # (path on disk, name in archive) for every finished file, in a stable order
+    members = []
+    for root, dirs, files in os.walk(folder_path):
+        dirs.sort()
+        for name in sorted(files):
+            if name.endswith(".part"):
+                # A PDF still being printed
+                continue
+            path = os.path.join(root, name)
+            members.append((path, os.path.relpath(path, folder_path).replace(os.sep, "/")))
+    return members
+
+
+def stream_zip(folder_path, chunk_size=None):
+    # Yields a ZIP of folder_path piece by piece. PDFs are already compressed,
+    # so entries are STORED; sizes and CRCs go in data descriptors after each
+    # entry, which is what lets the archive be written without seeking.
+    # ZipFile switches to ZIP64 records on its own for large files and folders.
+    chunk_size = chunk_size or ZIP_CHUNK_SIZE
+    sink = _ChunkSink()
+    archive = zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_STORED, allowZip64=True)
+    for path, arcname in archive_members(folder_path):
+        try:
+            source = open(path, "rb")
+        except OSError:
+            # Removed since the folder was listed
+            continue
+        with source:
+            info = zipfile.ZipInfo.from_file(path, arcname)
+            info.compress_type = zipfile.ZIP_STORED
+            with archive.open(info, "w") as entry:
+                for chunk in iter(lambda: source.read(chunk_size), b""):
+                    entry.write(chunk)
+                    yield sink.drain()
+        yield sink.drain()
+    # Central directory
+    archive.close()
+    yield sink.drain()